@@ -4,20 +4,28 @@ GUARDIÁN DE BACKUPS CON VERIFICACIÓN
 Versión mejorada con múltiples niveles de backup y verificación
 """
 import os
+import re
 import sys
+import copy
 import json
+import fnmatch
 import hashlib
+import sqlite3
 import shutil
 import subprocess
-import threading
-import tarfile
-import gzip
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 import logging
+import logging.handlers
+
+try:
+    import orjson  # opcional: serialización JSON mucho más rápida
+except ImportError:
+    orjson = None
 
 class BackupType(Enum):
     FULL = "full"
@@ -63,21 +71,79 @@ class BackupGuardian:
         # Cargar configuración
         self.config = self._load_config(config_file)
         
+        # Compilar las exclusiones una sola vez: una alternación regex para
+        # los patrones glob y un set para los directorios excluidos
+        patrones = self.config["exclusiones"]["patrones"]
+        self._exclude_re = re.compile(
+            "(?:" + ")|(?:".join(fnmatch.translate(p) for p in patrones) + ")"
+        ) if patrones else None
+        self._exclude_dirs = frozenset(self.config["exclusiones"]["directorios"])
+        # Variantes en cadena de los directorios excluidos para comprobar
+        # rutas sin trocearlas ni construir objetos Path
+        self._exclude_dir_tokens = tuple(
+            f"{os.sep}{d}{os.sep}" for d in self._exclude_dirs
+        )
+        self._exclude_dir_suffixes = tuple(
+            f"{os.sep}{d}" for d in self._exclude_dirs
+        )
+        # Umbral de tamaño en bytes enteros: la comparación por archivo no
+        # necesita la división flotante a MB (solo el log al excluir)
+        self._max_size_bytes = int(self.config["exclusiones"]["tamanio_maximo_mb"]) << 20
+
+        # Archivo de exclusiones para rsync: rsync lo mapea directamente,
+        # sin esperar a parsear un pipe de stdin antes de empezar a recorrer
+        self._rsync_excludes_file = self.config_dir / "rsync_excludes.txt"
+        self._write_rsync_excludes()
+
+        # Resolver el algoritmo de checksum una sola vez (no por archivo)
+        self._hash_name = self.config["verificacion"]["checksum_algorithm"]
+        if self._hash_name not in hashlib.algorithms_available:
+            self.logger.warning(f"Algoritmo desconocido '{self._hash_name}', usando sha256")
+            self._hash_name = "sha256"
+        self._chunk_size = self.config["verificacion"]["buffer_lectura_mb"] * 1024 * 1024
+
+        # Historial y manifiestos en SQLite (append-only, consultable)
+        self.db_path = self.config_dir / "backups.db"
+        self.db = self._init_manifest_db()
+
+        # Conexión D-Bus perezosa para notificaciones sin fork/exec
+        self._dbus_conn = None
+
         # Estadísticas
         self.stats = BackupStats()
-        self.backup_history = []
         
     def _setup_logging(self):
-        """Configurar sistema de logging"""
+        """Configurar sistema de logging
+
+        Nivel configurable con BACKUP_LOG_LEVEL. Las escrituras al archivo
+        se amortiguan en memoria (se vuelcan cada 1024 registros o ante un
+        ERROR) para no pagar una escritura a disco por mensaje durante las
+        operaciones masivas.
+        """
         log_file = self.log_dir / f"backup_{datetime.now().strftime('%Y-%m')}.log"
-        
+
+        nivel_nombre = os.environ.get("BACKUP_LOG_LEVEL", "INFO").upper()
+        nivel = getattr(logging, nivel_nombre, logging.INFO)
+
+        formato = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        # basicConfig asigna el formato al MemoryHandler envoltorio, no a
+        # su target: el FileHandler necesita el suyo o los registros
+        # volcados saldrían sin timestamp ni nivel
+        file_handler.setFormatter(formato)
+        handlers = [logging.handlers.MemoryHandler(
+            capacity=1024, flushLevel=logging.ERROR, target=file_handler
+        )]
+        # La salida por pantalla solo tiene sentido en niveles verbosos
+        if nivel <= logging.INFO:
+            handlers.append(logging.StreamHandler(sys.stdout))
+
         logging.basicConfig(
-            level=logging.INFO,
+            level=nivel,
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)
-            ]
+            handlers=handlers
         )
         self.logger = logging.getLogger('BackupGuardian')
         
@@ -95,9 +161,10 @@ class BackupGuardian:
                 "destino_base": "/media/tuusuario/Backup_Drive",
                 "nombre_backup": "backup_home",
                 "tipo": "incremental",  # full, incremental, differential
-                "compresion": "gz",  # none, gz, bz2, xz
+                "compresion": "gz",  # none, gz, bz2, xz, zstd
+                "fast_local": True,  # destino local: copiar archivos enteros
                 "encryption": {
-                    "habilitado": false,
+                    "habilitado": False,
                     "password": "",
                     "algorithm": "aes256"
                 }
@@ -127,17 +194,19 @@ class BackupGuardian:
                 "full_cada_dias": 7,
                 "mantener_backups": 30,
                 "hora_auto": "02:00",
-                "ejecutar_auto": false
+                "ejecutar_auto": False
             },
             "verificacion": {
-                "verificar_integridad": true,
+                "verificar_integridad": True,
                 "checksum_algorithm": "sha256",
-                "verificar_espacio": true,
+                "buffer_lectura_mb": 4,
+                "checksum_workers": 0,  # 0 = os.cpu_count()
+                "verificar_espacio": True,
                 "espacio_minimo_gb": 10
             },
             "notificaciones": {
-                "notificar_kde": true,
-                "notificar_email": false,
+                "notificar_kde": True,
+                "notificar_email": False,
                 "email": "tu@email.com"
             }
         }
@@ -151,28 +220,157 @@ class BackupGuardian:
             return config_default
         
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # Merge con valores por defecto
-                return self._merge_configs(config_default, config)
+            datos = config_path.read_bytes()
+            config = orjson.loads(datos) if orjson else json.loads(datos)
+            # Merge con valores por defecto
+            return self._merge_configs(config_default, config)
         except Exception as e:
             self.logger.error(f"Error cargando configuración: {e}")
             return config_default
     
     def _merge_configs(self, default: Dict, user: Dict) -> Dict:
-        """Combinar configuración por defecto con la del usuario"""
-        merged = default.copy()
-        
-        def recursive_merge(base, update):
+        """Combinar configuración por defecto con la del usuario
+
+        Copia profunda (una copia superficial dejaría los sub-dicts por
+        defecto compartidos y mutables) y merge con pila explícita en vez
+        de recursión.
+        """
+        merged = copy.deepcopy(default)
+
+        pendientes = [(merged, user)]
+        while pendientes:
+            base, update = pendientes.pop()
             for key, value in update.items():
-                if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                    recursive_merge(base[key], value)
+                if isinstance(value, dict) and isinstance(base.get(key), dict):
+                    pendientes.append((base[key], value))
                 else:
                     base[key] = value
-        
-        recursive_merge(merged, user)
+
         return merged
     
+    def _init_manifest_db(self) -> sqlite3.Connection:
+        """Abrir/crear la base de datos de historial y manifiestos
+
+        Un manifiesto por archivo en JSON crece O(N) y se reserializa
+        entero en cada run; en SQLite las filas se añaden en una sola
+        transacción y consultar un archivo es una búsqueda indexada.
+        """
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS backups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                origen TEXT,
+                destino TEXT,
+                total_files INTEGER,
+                total_size INTEGER,
+                files_copied INTEGER,
+                files_skipped INTEGER,
+                errors INTEGER,
+                duration_seconds REAL
+            )
+        ''')
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                backup_id INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                sha TEXT,
+                FOREIGN KEY (backup_id) REFERENCES backups (id)
+            )
+        ''')
+        db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_files_backup_path ON files(backup_id, path)'
+        )
+        db.commit()
+        return db
+
+    def _write_rsync_excludes(self):
+        """Volcar las exclusiones al archivo que consume rsync
+
+        Solo se reescribe si el contenido cambió respecto al de disco.
+        """
+        exclusiones = list(self.config["exclusiones"]["patrones"])
+        exclusiones.extend(
+            f"*/{directorio}/*"
+            for directorio in self.config["exclusiones"]["directorios"]
+        )
+        contenido = "\n".join(exclusiones) + "\n"
+
+        try:
+            if (not self._rsync_excludes_file.exists()
+                    or self._rsync_excludes_file.read_text(encoding='utf-8') != contenido):
+                self._rsync_excludes_file.write_text(contenido, encoding='utf-8')
+        except OSError as e:
+            self.logger.error(f"Error escribiendo exclusiones de rsync: {e}")
+
+    def _rsync_base_cmd(self) -> List[str]:
+        """Argumentos comunes de rsync para todos los modos de backup"""
+        cmd = ["rsync", "-avh", "--delete", "--info=stats2",
+               f"--exclude-from={self._rsync_excludes_file}"]
+        # En disco→disco local el algoritmo delta de rsync solo añade
+        # lecturas y checksums del destino: mejor copiar archivos enteros
+        if self.config["backup"]["fast_local"]:
+            cmd.extend(["--whole-file", "--preallocate"])
+        # --progress es caro y solo aporta algo en una terminal interactiva
+        if sys.stdout.isatty():
+            cmd.append("--progress")
+        return cmd
+
+    @staticmethod
+    def _parse_rsync_number(texto: str) -> float:
+        """Convertir un número de las stats de rsync (admite sufijos -h)"""
+        match = re.search(r"([\d.,]+)([KMGT]?)", texto)
+        if not match:
+            return 0.0
+        valor = float(match.group(1).replace(",", ""))
+        factor = {"": 1, "K": 1024, "M": 1024**2,
+                  "G": 1024**3, "T": 1024**4}[match.group(2)]
+        return valor * factor
+
+    def _run_rsync(self, cmd: List[str]) -> bool:
+        """Ejecutar rsync consumiendo su salida línea a línea
+
+        Evita acumular toda la salida en memoria (con --progress pueden ser
+        MBs) y recoge las estadísticas finales de --info=stats2.
+        """
+        self.logger.info(f"Ejecutando rsync: {' '.join(cmd)}")
+
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+
+        num_linea = 0
+        for linea in proc.stdout:
+            linea = linea.strip()
+            if not linea:
+                continue
+
+            if linea.startswith("Number of regular files transferred:"):
+                self.stats.files_copied = int(self._parse_rsync_number(linea))
+            elif linea.startswith("Number of files:"):
+                self.stats.total_files = int(self._parse_rsync_number(linea))
+            elif linea.startswith("Total transferred file size:"):
+                self.stats.total_size = int(
+                    self._parse_rsync_number(linea.split(":", 1)[1])
+                )
+            else:
+                # Solo una muestra del detalle por archivo va al log
+                num_linea += 1
+                if num_linea % 1000 == 0:
+                    self.logger.info(f"rsync: {linea}")
+
+        return proc.wait() == 0
+
     def _check_disk_space(self) -> bool:
         """Verificar espacio en disco disponible"""
         if not self.config["verificacion"]["verificar_espacio"]:
@@ -195,109 +393,401 @@ class BackupGuardian:
         self.logger.info(f"Espacio disponible: {espacio_libre_gb:.1f}GB")
         return True
     
-    def _should_exclude(self, path: Path) -> bool:
-        """Determinar si un archivo/directorio debe ser excluido"""
-        path_str = str(path)
-        
-        # Verificar patrones de exclusión
-        for patron in self.config["exclusiones"]["patrones"]:
-            import fnmatch
-            if fnmatch.fnmatch(path_str, patron):
-                return True
-        
-        # Verificar directorios excluidos
-        for dir_name in self.config["exclusiones"]["directorios"]:
-            if dir_name in path.parts:
+    def _matches_exclusion(self, path_str: str) -> bool:
+        """Comprobar patrones y directorios de exclusión sobre una ruta
+
+        Trabaja solo con cadenas: nada de Path ni troceo en componentes en
+        el camino caliente.
+        """
+        if self._exclude_re and self._exclude_re.match(path_str):
+            return True
+        for token in self._exclude_dir_tokens:
+            if token in path_str:
                 return True
-        
-        # Verificar tamaño máximo
-        if path.is_file():
-            tamanio_mb = path.stat().st_size / (1024**2)
-            if tamanio_mb > self.config["exclusiones"]["tamanio_maximo_mb"]:
-                self.logger.warning(f"Archivo muy grande excluido: {path} ({tamanio_mb:.1f}MB)")
+        return path_str.endswith(self._exclude_dir_suffixes)
+
+    def _should_exclude_entry(self, entry: os.DirEntry,
+                              st: os.stat_result = None) -> bool:
+        """Determinar si un archivo/directorio debe ser excluido.
+
+        Trabaja sobre os.DirEntry para reutilizar los metadatos que
+        scandir ya trae cacheados, sin stat() extra por archivo. Si el
+        llamante ya hizo stat() puede pasarlo en `st`.
+        """
+        if self._matches_exclusion(entry.path):
+            return True
+
+        if entry.is_file(follow_symlinks=False):
+            if st is None:
+                st = entry.stat(follow_symlinks=False)
+            if st.st_size > self._max_size_bytes:
+                # DEBUG y formato perezoso: en el bucle caliente no se
+                # construye la cadena si el nivel no lo pide
+                self.logger.debug(
+                    "Archivo muy grande excluido: %s (%.1fMB)",
+                    entry.path, st.st_size / (1024**2)
+                )
                 return True
-        
+
         return False
+
+    def _walk(self, root: Path):
+        """Recorrer un árbol con os.scandir produciendo os.DirEntry
+
+        Iterativo (pila explícita) para no pagar recursión ni objetos Path
+        intermedios en árboles grandes. Los directorios excluidos por
+        configuración se podan aquí: sus subárboles ni se visitan.
+        """
+        exclude_dirs = self._exclude_dirs
+        pendientes = [str(root)]
+        while pendientes:
+            directorio = pendientes.pop()
+            try:
+                with os.scandir(directorio) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in exclude_dirs:
+                                pendientes.append(entry.path)
+                        else:
+                            yield entry
+            except OSError as e:
+                self.logger.warning(f"No se pudo recorrer {directorio}: {e}")
     
     def _calculate_checksum(self, file_path: Path) -> Optional[str]:
         """Calcular checksum de un archivo"""
-        algorithm = self.config["verificacion"]["checksum_algorithm"]
-        hasher = getattr(hashlib, algorithm, hashlib.sha256)()
-        
+        # Leer en bloques grandes (MiB) para que el coste lo domine el motor
+        # de hashing y no las llamadas por bloque de 8 KiB
+        chunk_size = self._chunk_size
+        fadvise = getattr(os, "posix_fadvise", None)
+
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError as e:
+            self.logger.error(f"Error calculando checksum de {file_path}: {e}")
+            return None
+
         try:
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(8192), b''):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+            # Avisar al kernel: lectura secuencial (readahead agresivo)
+            if fadvise:
+                fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+            # buffering=0 evita la doble copia del buffer interno de Python
+            with os.fdopen(fd, 'rb', buffering=0, closefd=False) as f:
+                if hasattr(hashlib, "file_digest"):  # Python >= 3.11
+                    # Ruta nativa de OpenSSL (SHA-NI/AVX2) con el GIL liberado
+                    digest = hashlib.file_digest(f, self._hash_name).hexdigest()
+                else:
+                    hasher = hashlib.new(self._hash_name)
+                    buffer = bytearray(chunk_size)
+                    view = memoryview(buffer)
+                    while True:
+                        leidos = f.readinto(buffer)
+                        if not leidos:
+                            break
+                        hasher.update(view[:leidos])
+                    digest = hasher.hexdigest()
+
+            # No dejar el backup entero residente en la page cache
+            if fadvise:
+                fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            return digest
         except Exception as e:
             self.logger.error(f"Error calculando checksum de {file_path}: {e}")
             return None
+        finally:
+            os.close(fd)
     
+    def _checksum_tree(self, root: Path) -> List[Tuple[str, int, float, str]]:
+        """Calcular checksums de todos los archivos bajo un directorio.
+
+        El recorrido usa os.scandir con una pila explícita y los hashes se
+        calculan en paralelo: cada uno libera el GIL dentro de OpenSSL, así
+        que el límite pasa a ser el ancho de banda del disco.
+
+        Devuelve tuplas (ruta_relativa, tamanio, mtime, sha) listas para
+        insertarse en la tabla de manifiestos.
+        """
+        archivos = []
+        for entry in self._walk(root):
+            if entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                archivos.append((entry.path, st.st_size, st.st_mtime))
+
+        workers = self.config["verificacion"]["checksum_workers"] or os.cpu_count()
+        filas = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futuros = {
+                pool.submit(self._calculate_checksum, Path(ruta)): (ruta, size, mtime)
+                for ruta, size, mtime in archivos
+            }
+            for futuro in as_completed(futuros):
+                digest = futuro.result()
+                if digest:
+                    ruta, size, mtime = futuros[futuro]
+                    filas.append((os.path.relpath(ruta, root), size, mtime, digest))
+
+        return filas
+
     def _backup_with_rsync(self, origen: Path, destino: Path) -> bool:
         """Realizar backup usando rsync (más eficiente para muchos archivos)"""
         try:
             # Construir comando rsync
-            cmd = [
-                "rsync", "-avh", "--progress", "--delete",
-                "--exclude-from=-",  # Leer exclusiones de stdin
+            cmd = self._rsync_base_cmd() + [
                 str(origen) + "/",
                 str(destino)
             ]
-            
-            # Preparar exclusiones para stdin
-            exclusiones = []
-            for patron in self.config["exclusiones"]["patrones"]:
-                exclusiones.append(patron)
-            for directorio in self.config["exclusiones"]["directorios"]:
-                exclusiones.append(f"*/{directorio}/*")
-            
-            exclusiones_str = "\n".join(exclusiones)
-            
+
             # Ejecutar rsync
-            self.logger.info(f"Ejecutando rsync: {' '.join(cmd)}")
-            result = subprocess.run(
-                cmd,
-                input=exclusiones_str.encode(),
-                capture_output=True,
-                text=False
-            )
-            
-            if result.returncode == 0:
+            if self._run_rsync(cmd):
                 self.logger.info("Backup con rsync completado")
                 return True
             else:
-                self.logger.error(f"Error en rsync: {result.stderr}")
+                self.logger.error("Error en rsync (ver líneas anteriores)")
                 return False
-                
+
         except Exception as e:
             self.logger.error(f"Error ejecutando rsync: {e}")
             return False
     
+    def _copy_file(self, src: str, dst: str):
+        """Copiar un archivo sin pasar los datos por espacio de usuario
+
+        Intenta copy_file_range (Linux >= 4.5, con reflink en btrfs/XFS),
+        luego sendfile, y como último recurso la copia clásica de shutil.
+        """
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            in_fd = fsrc.fileno()
+            out_fd = fdst.fileno()
+            size = os.fstat(in_fd).st_size
+
+            if size and hasattr(os, "copy_file_range"):
+                try:
+                    restantes = size
+                    while restantes > 0:
+                        copiados = os.copy_file_range(in_fd, out_fd, restantes)
+                        if copiados == 0:
+                            break
+                        restantes -= copiados
+                    if restantes == 0:
+                        shutil.copystat(src, dst)
+                        return
+                    # Transferencia cortada a medias (origen encogido,
+                    # FS raro): rebobinar igual que ante un OSError o el
+                    # siguiente intento arrancaría con el destino a medio
+                    # escribir y el origen desde cero
+                    fsrc.seek(0)
+                    fdst.seek(0)
+                    fdst.truncate()
+                except OSError:
+                    fsrc.seek(0)
+                    fdst.seek(0)
+                    fdst.truncate()
+
+            if size:
+                try:
+                    # sendfile puede transferir menos de lo pedido (tope
+                    # ~2 GiB por llamada): iterar sobre lo devuelto o el
+                    # backup quedaría truncado reportándose como copiado
+                    enviados = 0
+                    while enviados < size:
+                        n = os.sendfile(out_fd, in_fd, enviados, size - enviados)
+                        if n == 0:
+                            break
+                        enviados += n
+                    if enviados == size:
+                        shutil.copystat(src, dst)
+                        return
+                    fsrc.seek(enviados)
+                    fdst.seek(enviados)
+                except OSError:
+                    fsrc.seek(0)
+                    fdst.seek(0)
+                    fdst.truncate()
+
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        shutil.copystat(src, dst)
+
+    def _perform_python_backup(self, origen: Path, destino: Path) -> bool:
+        """Backup en Python puro cuando rsync no está disponible"""
+        self.logger.warning("rsync no disponible, usando copia en Python")
+
+        try:
+            for entry in self._walk(origen):
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                # Un único stat por archivo, compartido con la exclusión
+                st = entry.stat(follow_symlinks=False)
+                if self._should_exclude_entry(entry, st):
+                    self.stats.files_skipped += 1
+                    continue
+
+                relativo = os.path.relpath(entry.path, origen)
+                dst = destino / relativo
+                try:
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    self._copy_file(entry.path, str(dst))
+                    self.stats.files_copied += 1
+                    self.stats.total_size += st.st_size
+                except OSError as e:
+                    self.stats.errors += 1
+                    self.logger.error(f"Error copiando {entry.path}: {e}")
+
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error en backup Python: {e}")
+            return False
+
+    def _python_incremental_copy(self, origen: Path, destino: Path,
+                                 lista: Path) -> bool:
+        """Incremental en Python puro: copiar solo los archivos del índice
+
+        Reutiliza la lista separada por NUL que _find_changed deja para
+        --files-from, de modo que la ausencia de rsync no convierte cada
+        incremental en un recorrido completo.
+        """
+        self.logger.warning("rsync no disponible, incremental con copia en Python")
+
+        try:
+            for relativo in lista.read_bytes().decode().split("\0"):
+                if not relativo:
+                    continue
+                src = origen / relativo
+                dst = destino / relativo
+                try:
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    self._copy_file(str(src), str(dst))
+                    self.stats.files_copied += 1
+                    self.stats.total_size += dst.stat().st_size
+                except OSError as e:
+                    self.stats.errors += 1
+                    self.logger.error(f"Error copiando {src}: {e}")
+
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error en incremental Python: {e}")
+            return False
+
+    def _backup_with_tar_zstd(self, origen: Path, destino: Path) -> bool:
+        """Backup comprimido en streaming: tar | zstd
+
+        Tanto tar (GNU, en C) como zstd (-T0, multihilo) corren fuera de
+        Python: los datos no pasan por el intérprete, a diferencia de
+        tarfile/gzip. Si falta el binario zstd se usa el módulo zstandard.
+        """
+        archivo_salida = destino / f"{self.config['backup']['nombre_backup']}.tar.zst"
+        tar_cmd = [
+            "tar", "--create",
+            f"--exclude-from={self._rsync_excludes_file}",
+            "-C", str(origen), "."
+        ]
+
+        try:
+            tar_proc = subprocess.Popen(tar_cmd, stdout=subprocess.PIPE)
+
+            if shutil.which("zstd") is not None:
+                zstd_proc = subprocess.run(
+                    ["zstd", "-T0", "-19", "--long=27", "-q",
+                     "-o", str(archivo_salida)],
+                    stdin=tar_proc.stdout
+                )
+                tar_proc.stdout.close()
+                success = tar_proc.wait() == 0 and zstd_proc.returncode == 0
+            else:
+                try:
+                    import zstandard
+                except ImportError:
+                    tar_proc.kill()
+                    tar_proc.wait()
+                    self.logger.error(
+                        "zstd no disponible (ni binario ni módulo zstandard)"
+                    )
+                    return False
+
+                cctx = zstandard.ZstdCompressor(level=19, threads=-1)
+                with open(archivo_salida, 'wb') as salida:
+                    cctx.copy_stream(tar_proc.stdout, salida)
+                success = tar_proc.wait() == 0
+
+            if success:
+                self.logger.info(f"Backup comprimido creado: {archivo_salida}")
+            else:
+                self.logger.error("Error en backup comprimido tar|zstd")
+            return success
+
+        except Exception as e:
+            self.logger.error(f"Error ejecutando tar|zstd: {e}")
+            return False
+
     def _create_backup_manifest(self, backup_path: Path):
-        """Crear manifiesto con información del backup"""
+        """Registrar el backup y sus checksums en la base de datos
+
+        Los checksums por archivo van a la tabla `files` en una sola
+        transacción; en el directorio del backup solo queda una cabecera
+        JSON compacta que apunta al registro.
+        """
+        duracion = self.stats.duration.total_seconds() if self.stats.duration else None
+
+        with self.db:
+            cursor = self.db.execute('''
+                INSERT INTO backups (
+                    fecha, tipo, origen, destino, total_files, total_size,
+                    files_copied, files_skipped, errors, duration_seconds
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                datetime.now().isoformat(),
+                self.config["backup"]["tipo"],
+                self.config["backup"]["origen"],
+                str(backup_path),
+                self.stats.total_files,
+                self.stats.total_size,
+                self.stats.files_copied,
+                self.stats.files_skipped,
+                self.stats.errors,
+                duracion
+            ))
+            backup_id = cursor.lastrowid
+
+            # Checksums del backup (en paralelo) si la verificación está activa
+            if self.config["verificacion"]["verificar_integridad"]:
+                filas = self._checksum_tree(backup_path)
+                self.db.executemany(
+                    'INSERT INTO files (backup_id, path, size, mtime, sha) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(backup_id,) + fila for fila in filas]
+                )
+
+        # Cabecera compacta en el propio backup
         manifest = {
+            "backup_id": backup_id,
             "fecha": datetime.now().isoformat(),
             "tipo": self.config["backup"]["tipo"],
             "origen": self.config["backup"]["origen"],
             "destino": str(backup_path),
+            "manifest_db": str(self.db_path),
             "estadisticas": {
                 "total_files": self.stats.total_files,
                 "total_size_gb": self.stats.total_size / (1024**3),
                 "files_copied": self.stats.files_copied,
                 "files_skipped": self.stats.files_skipped,
                 "errors": self.stats.errors,
-                "duration_seconds": self.stats.duration.total_seconds() if self.stats.duration else None,
+                "duration_seconds": duracion,
                 "speed_mbps": self.stats.speed_mbps
-            },
-            "checksums": {}
+            }
         }
-        
-        # Guardar manifiesto
+
         manifest_file = backup_path / "backup_manifest.json"
-        with open(manifest_file, 'w', encoding='utf-8') as f:
-            json.dump(manifest, f, indent=4, ensure_ascii=False)
-        
-        self.logger.info(f"Manifiesto creado: {manifest_file}")
+        if orjson:
+            manifest_file.write_bytes(
+                orjson.dumps(manifest, option=orjson.OPT_INDENT_2)
+            )
+        else:
+            with open(manifest_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=4)
+
+        self.logger.info(f"Manifiesto creado: {manifest_file} (backup #{backup_id})")
     
     def run_backup(self, tipo: str = None) -> bool:
         """Ejecutar backup"""
@@ -371,19 +861,108 @@ class BackupGuardian:
     def _perform_full_backup(self, origen: Path, destino: Path) -> bool:
         """Realizar backup completo"""
         self.logger.info(f"Backup COMPLETO: {origen} → {destino}")
-        
-        # Usar rsync para eficiencia
+
+        # Archivo comprimido en streaming si se pidió zstd
+        if self.config["backup"]["compresion"] == "zstd":
+            return self._backup_with_tar_zstd(origen, destino)
+
+        # Usar rsync para eficiencia; copia en Python si no está instalado
+        if shutil.which("rsync") is None:
+            return self._perform_python_backup(origen, destino)
         return self._backup_with_rsync(origen, destino)
     
+    def _find_changed(self, origen: Path) -> Optional[Path]:
+        """Listar archivos cambiados respecto al último manifiesto
+
+        Compara (tamaño, mtime) de un recorrido O(N) contra el índice
+        SQLite de los manifiestos y escribe la lista (separada por NUL)
+        para --files-from. Devuelve None si no hay manifiesto utilizable.
+        """
+        # El último backup puede ser un incremental cuyo manifiesto solo
+        # contiene los archivos de esa pasada: fusionar los manifiestos
+        # quedándose con la fila más reciente por ruta, de modo que el
+        # índice represente el estado completo del origen y el siguiente
+        # incremental no recopie casi todo el árbol
+        indice = {}
+        for path, size, mtime in self.db.execute(
+                'SELECT path, size, mtime FROM files ORDER BY backup_id'):
+            indice[path] = (size, mtime)
+        if not indice:
+            return None
+
+        cambiados = []
+        for entry in self._walk(origen):
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if self._should_exclude_entry(entry, st):
+                continue
+
+            relativo = os.path.relpath(entry.path, origen)
+            anterior = indice.get(relativo)
+            if (anterior is None
+                    or anterior[0] != st.st_size
+                    or abs(anterior[1] - st.st_mtime) > 1e-6):
+                cambiados.append(relativo)
+
+        lista = self.config_dir / "rsync_files_from.txt"
+        lista.write_bytes("\0".join(cambiados).encode())
+        self.logger.info(f"Incremental por índice: {len(cambiados)} archivos cambiados")
+        return lista
+
     def _perform_incremental_backup(self, origen: Path, destino: Path) -> bool:
         """Realizar backup incremental"""
         self.logger.info(f"Backup INCREMENTAL: {origen} → {destino}")
+
+        # Con manifiesto previo en la DB, rsync no recorre ni compara
+        # nada: recibe la lista exacta de archivos cambiados
+        try:
+            lista = self._find_changed(origen)
+        except Exception as e:
+            self.logger.warning(f"Índice de manifiesto no disponible: {e}")
+            lista = None
+
+        # Sin rsync la copia en Python cubre también el incremental:
+        # con índice copia solo los archivos cambiados; sin él, backup
+        # completo (ambos caminos rsync de abajo fallarían al arrancar)
+        if shutil.which("rsync") is None:
+            if lista is not None:
+                return self._python_incremental_copy(origen, destino, lista)
+            self.logger.warning(
+                "Sin rsync ni manifiesto previo, haciendo backup completo"
+            )
+            return self._perform_python_backup(origen, destino)
+
+        if lista is not None:
+            # --delete no es fiable combinado con --files-from
+            cmd = [arg for arg in self._rsync_base_cmd() if arg != "--delete"]
+            cmd += [
+                f"--files-from={lista}", "--from0",
+                str(origen) + "/",
+                str(destino)
+            ]
+            try:
+                return self._run_rsync(cmd)
+            except Exception as e:
+                self.logger.error(f"Error en incremental por índice: {e}")
+                return False
         
-        # Buscar último backup para comparar
+        # Buscar último backup para comparar (scandir, sin objetos Path)
         backup_base = Path(self.config["backup"]["destino_base"])
-        backups = list(backup_base.glob(f"{self.config['backup']['nombre_backup']}_*_full"))
-        backups.sort(reverse=True)
-        
+        prefijo = f"{self.config['backup']['nombre_backup']}_"
+        backups = []
+        try:
+            with os.scandir(backup_base) as entries:
+                backups = sorted(
+                    (Path(entry.path) for entry in entries
+                     if entry.name.startswith(prefijo)
+                     and entry.name.endswith("_full")
+                     and entry.is_dir(follow_symlinks=False)),
+                    reverse=True
+                )
+        except OSError as e:
+            self.logger.error(f"No se pudo listar {backup_base}: {e}")
+
         if not backups:
             self.logger.warning("No hay backup completo previo, haciendo backup completo")
             return self._perform_full_backup(origen, destino)
@@ -391,28 +970,25 @@ class BackupGuardian:
         # Usar rsync con link-dest para incremental
         try:
             last_backup = backups[0]
-            cmd = [
-                "rsync", "-avh", "--progress", "--delete",
+
+            # --link-dest necesita el mismo sistema de archivos que el
+            # destino: si no, los hardlinks fallan y se duplica el espacio
+            try:
+                if last_backup.stat().st_dev != destino.stat().st_dev:
+                    self.logger.warning(
+                        f"--link-dest en otro sistema de archivos: {last_backup}"
+                    )
+            except OSError:
+                pass
+
+            cmd = self._rsync_base_cmd() + [
                 f"--link-dest={last_backup}",
-                "--exclude-from=-",
                 str(origen) + "/",
                 str(destino)
             ]
-            
-            # Preparar exclusiones
-            exclusiones = self.config["exclusiones"]["patrones"] + \
-                         [f"*/{d}/*" for d in self.config["exclusiones"]["directorios"]]
-            exclusiones_str = "\n".join(exclusiones)
-            
-            result = subprocess.run(
-                cmd,
-                input=exclusiones_str.encode(),
-                capture_output=True,
-                text=False
-            )
-            
-            return result.returncode == 0
-            
+
+            return self._run_rsync(cmd)
+
         except Exception as e:
             self.logger.error(f"Error en backup incremental: {e}")
             return False
@@ -420,38 +996,85 @@ class BackupGuardian:
     def _clean_old_backups(self):
         """Eliminar backups antiguos según la política de retención"""
         try:
-            backup_base = Path(self.config["backup"]["destino_base"])
+            backup_base = self.config["backup"]["destino_base"]
             dias_a_mantener = self.config["programacion"]["mantener_backups"]
-            
+
             cutoff_date = datetime.now() - timedelta(days=dias_a_mantener)
-            
-            for backup_dir in backup_base.glob(f"{self.config['backup']['nombre_backup']}_*"):
-                if backup_dir.is_dir():
-                    # Extraer fecha del nombre del directorio
+
+            # La fecha se extrae del nombre del directorio, sin stat extra
+            patron_fecha = re.compile(
+                rf"^{re.escape(self.config['backup']['nombre_backup'])}_(\d{{8}})_"
+            )
+
+            with os.scandir(backup_base) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+
+                    match = patron_fecha.match(entry.name)
+                    if not match:
+                        continue
+
                     try:
-                        fecha_str = backup_dir.name.split('_')[1]  # YYYYMMDD
-                        fecha_backup = datetime.strptime(fecha_str, "%Y%m%d")
-                        
-                        if fecha_backup < cutoff_date:
-                            self.logger.info(f"Eliminando backup antiguo: {backup_dir}")
-                            shutil.rmtree(backup_dir)
-                    except (IndexError, ValueError):
+                        fecha_backup = datetime.strptime(match.group(1), "%Y%m%d")
+                    except ValueError:
                         continue
-                        
+
+                    if fecha_backup < cutoff_date:
+                        self.logger.info(f"Eliminando backup antiguo: {entry.path}")
+                        shutil.rmtree(entry.path)
+
         except Exception as e:
             self.logger.error(f"Error limpiando backups antiguos: {e}")
     
+    def _notify_dbus(self, titulo: str, mensaje: str) -> bool:
+        """Notificar vía D-Bus (org.freedesktop.Notifications)
+
+        Sin fork/exec de kdialog por aviso; la conexión se abre una vez y
+        se reutiliza. Devuelve False si jeepney o el bus no están
+        disponibles, para que el llamante use el fallback.
+        """
+        try:
+            from jeepney import DBusAddress, new_method_call
+            from jeepney.io.blocking import open_dbus_connection
+        except ImportError:
+            return False
+
+        try:
+            if self._dbus_conn is None:
+                self._dbus_conn = open_dbus_connection(bus='SESSION')
+
+            notificaciones = DBusAddress(
+                '/org/freedesktop/Notifications',
+                bus_name='org.freedesktop.Notifications',
+                interface='org.freedesktop.Notifications'
+            )
+            mensaje_dbus = new_method_call(
+                notificaciones, 'Notify', 'susssasa{sv}i',
+                ('guardian_backups', 0, 'dialog-information',
+                 titulo, mensaje, [], {}, 10000)
+            )
+            self._dbus_conn.send_and_get_reply(mensaje_dbus)
+            return True
+        except Exception:
+            self._dbus_conn = None
+            return False
+
     def _send_notification(self, titulo: str, mensaje: str):
         """Enviar notificación KDE"""
         if self.config["notificaciones"]["notificar_kde"]:
-            try:
-                subprocess.run([
-                    "kdialog", "--title", titulo,
-                    "--passivepopup", mensaje, "10"
-                ])
-            except Exception:
-                pass  # Silenciar error si kdialog no está disponible
-        
+            if not self._notify_dbus(titulo, mensaje):
+                try:
+                    subprocess.run(
+                        ["kdialog", "--title", titulo,
+                         "--passivepopup", mensaje, "10"],
+                        check=False,
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL
+                    )
+                except Exception:
+                    pass  # Silenciar error si kdialog no está disponible
+
         self.logger.info(f"{titulo}: {mensaje}")
 
 def main():
@@ -469,13 +1092,12 @@ def main():
         print(f"   Y asegúrate de que el dispositivo esté montado")
         return 1
     
-    # Verificar rsync
+    # Verificar rsync (hay fallback en Python, pero rsync es preferible)
     if shutil.which("rsync") is None:
-        print("❌ Error: rsync no está instalado")
+        print("⚠️  Aviso: rsync no está instalado, se usará copia en Python")
         print("   Instala con: sudo pacman -S rsync  # Arch")
         print("   o: sudo apt install rsync         # Debian/Ubuntu")
-        return 1
-    
+
     # Ejecutar backup
     print(f"🔄 Iniciando backup {guardian.config['backup']['tipo'].upper()}...")
     print(f"   Origen: {guardian.config['backup']['origen']}")
@@ -7,18 +7,58 @@ import os
 import sys
 import json
 import time
+import atexit
+import queue
 import sqlite3
-import smtplib
+from collections import deque
 import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
 import psutil
-import GPUtil
-import requests
+
+# GPUtil, requests y smtplib se importan perezosamente donde se usan:
+# cuestan decenas de ms al arrancar y --single/--report no los necesitan
+
+try:
+    import orjson  # opcional: serialización JSON mucho más rápida
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np  # opcional: agregados vectorizados del historial
+except ImportError:
+    np = None
+
+_IS_LINUX = sys.platform.startswith('linux')
+
+# Columnas del ring buffer de historial (mismo orden que SystemMetrics)
+COL_TS = 0
+COL_CPU = 1
+COL_CPU_TEMP = 2
+COL_MEM = 3
+COL_DISK = 6
+COL_SWAP = 9
+HIST_COLS = 17
+
+# SQL de los caminos calientes, definido una sola vez a nivel de módulo
+INSERT_METRIC_SQL = '''
+    INSERT INTO metrics (
+        timestamp, cpu_percent, cpu_temp, memory_percent,
+        memory_used_gb, memory_total_gb, disk_percent,
+        disk_used_gb, disk_total_gb, swap_percent,
+        network_sent_mb, network_recv_mb, uptime_hours,
+        processes, load_avg_1min, load_avg_5min, load_avg_15min
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_ALERT_SQL = '''
+    INSERT INTO alerts (timestamp, level, source, message, value, threshold)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
 
 class AlertLevel(Enum):
     INFO = "info"
@@ -28,7 +68,7 @@ class AlertLevel(Enum):
 @dataclass
 class SystemMetrics:
     """Métricas del sistema"""
-    timestamp: str
+    timestamp: int  # segundos desde epoch; ISO solo para mostrar
     cpu_percent: float
     cpu_temp: Optional[float]
     memory_percent: float
@@ -54,7 +94,7 @@ class Alert:
     message: str
     value: float
     threshold: float
-    timestamp: str
+    timestamp: int
 
 class SystemMonitor:
     def __init__(self, config_file: str = None):
@@ -75,14 +115,70 @@ class SystemMonitor:
         # Cargar configuración
         self.config = self._load_config(config_file)
         
-        # Inicializar base de datos
+        # Inicializar base de datos: una única conexión compartida en modo
+        # WAL; abrir/cerrar por escritura costaba un open + fsync por ciclo
         self.db_path = self.db_dir / "system_monitor.db"
+        self.conn = self._open_database()
         self._init_database()
+        self._cur = self.conn.cursor()  # cursor reutilizado en escrituras
+        atexit.register(self._close_database)
+
+        # Hilo escritor dedicado: el muestreo solo encola; un disco lento
+        # ya no retrasa la cadencia de los ciclos
+        self._write_q: queue.Queue = queue.Queue(maxsize=256)
+        self._writer_batch = 32
+        self._db_lock = threading.Lock()  # serializa escrituras con la poda
+        self._writer_stop = threading.Event()
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop, daemon=True, name="monitor-writer"
+        )
+        self._writer_thread.start()
+        atexit.register(self.flush_metrics)  # LIFO: vuelca antes de cerrar
         
         # Variables para cálculo de promedios
-        self.metrics_history: List[SystemMetrics] = []
         self.max_history_size = 60  # Mantener 60 mediciones
+        if np is not None:
+            # Ring buffer SoA float32: 17 columnas contiguas en vez de 60
+            # objetos dataclass; los agregados salen vectorizados
+            self._hist = np.zeros((self.max_history_size, HIST_COLS), dtype=np.float32)
+            self._hist_idx = 0
+            self.metrics_history = None
+        else:
+            # deque con maxlen: append O(1) y desalojo automático, sin pop(0)
+            self._hist = None
+            self._hist_idx = 0
+            self.metrics_history: Deque[SystemMetrics] = deque(maxlen=self.max_history_size)
         
+        # Snapshot cacheado: peticiones más rápidas que este intervalo
+        # reutilizan la última lectura en vez de reparsear /proc
+        self._last_metrics: Optional[SystemMetrics] = None
+        self._last_ts = 0.0
+        self._min_interval = 1.0
+
+        # Localizar el sensor de temperatura una vez; leer ese archivo
+        # directamente evita que psutil abra todos los hwmon cada ciclo
+        self._temp_path = self._discover_temp_path()
+
+        # Cebar el contador de CPU: las siguientes llamadas no bloquean,
+        # devuelven el uso desde la lectura anterior
+        psutil.cpu_percent(interval=None)
+
+        # El boot time no cambia: leerlo una vez, no en cada ciclo
+        self._boot_time = psutil.boot_time()
+
+        # Contadores de red previos para calcular tasas por delta; los
+        # acumulados desde el arranque no sirven como métrica
+        self._prev_net = psutil.net_io_counters()
+        self._prev_net_t = time.monotonic()
+
+        # Tabla de umbrales precalculada: una pasada en check_alerts en
+        # vez de siete bloques if con lookups repetidos al dict de config
+        self._alert_specs = self._build_alert_specs()
+
+        # Conexión D-Bus perezosa para notificaciones (evita un
+        # fork/exec de kdialog por alerta)
+        self._dbus_conn = None
+
         # Estadísticas
         self.alerts_today = 0
         self.start_time = datetime.now()
@@ -121,15 +217,15 @@ class SystemMonitor:
             },
             "monitoreo": {
                 "intervalo_segundos": 60,
-                "guardar_historial": true,
+                "guardar_historial": True,
                 "historial_dias": 7,
-                "monitorear_gpu": false,
-                "monitorear_red": true,
-                "monitorear_procesos": true
+                "monitorear_gpu": False,
+                "monitorear_red": True,
+                "monitorear_procesos": True
             },
             "alertas": {
-                "notificar_kde": true,
-                "notificar_email": false,
+                "notificar_kde": True,
+                "notificar_email": False,
                 "email_from": "monitor@dominio.com",
                 "email_to": "admin@dominio.com",
                 "smtp_server": "smtp.gmail.com",
@@ -140,37 +236,68 @@ class SystemMonitor:
                 "alertas_por_dia": 10
             },
             "acciones": {
-                "auto_reiniciar_servicios": false,
+                "auto_reiniciar_servicios": False,
                 "servicios_a_reiniciar": ["nginx", "postgresql"],
-                "limpiar_cache_alerta": false,
+                "limpiar_cache_alerta": False,
                 "cache_limite_mb": 1000
             }
         }
         
         if not config_path.exists():
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config_default, f, indent=4, ensure_ascii=False)
+            if orjson:
+                config_path.write_bytes(
+                    orjson.dumps(config_default, option=orjson.OPT_INDENT_2)
+                )
+            else:
+                with open(config_path, 'w', encoding='utf-8') as f:
+                    json.dump(config_default, f, indent=4, ensure_ascii=False)
             self.logger.warning(f"📄 Configuración creada en: {config_path}")
             return config_default
-        
+
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            datos = config_path.read_bytes()
+            return orjson.loads(datos) if orjson else json.loads(datos)
         except Exception as e:
             self.logger.error(f"Error cargando configuración: {e}")
             return config_default
     
+    def _open_database(self) -> sqlite3.Connection:
+        """Abrir la conexión compartida con los PRAGMA de rendimiento"""
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,  # transacciones explícitas
+            check_same_thread=False,
+            cached_statements=64
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        return conn
+
+    def _close_database(self):
+        """Parar el hilo escritor y cerrar la conexión compartida"""
+        try:
+            self._writer_stop.set()
+            self._writer_thread.join(timeout=5)
+            self.conn.close()
+        except Exception:
+            pass
+
     def _init_database(self):
         """Inicializar base de datos SQLite"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.conn
             cursor = conn.cursor()
-            
-            # Tabla de métricas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS metrics (
+
+            # Columnas de cada tabla, compartidas entre la creación y la
+            # reconstrucción al migrar bases heredadas
+            esquemas = {
+                'metrics': '''(
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
                     cpu_percent REAL,
                     cpu_temp REAL,
                     memory_percent REAL,
@@ -187,58 +314,152 @@ class SystemMonitor:
                     load_avg_1min REAL,
                     load_avg_5min REAL,
                     load_avg_15min REAL
-                )
-            ''')
-            
-            # Tabla de alertas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS alerts (
+                )''',
+                'alerts': '''(
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
                     level TEXT NOT NULL,
                     source TEXT NOT NULL,
                     message TEXT NOT NULL,
                     value REAL,
                     threshold REAL,
                     acknowledged INTEGER DEFAULT 0
+                )'''
+            }
+
+            for tabla, columnas in esquemas.items():
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {tabla} {columnas}')
+
+            # Migración de bases anteriores: la columna TEXT heredada se
+            # reconstruye como INTEGER convirtiendo las filas ISO a epoch
+            # una sola vez. TEXT ordena por encima de cualquier entero,
+            # así que sin esto cada fila vieja entraría en todas las
+            # ventanas del reporte y la poda nunca las borraría. Un
+            # UPDATE con CAST no basta: la afinidad TEXT de la columna
+            # volvería a guardar el entero como texto
+            for tabla, columnas in esquemas.items():
+                tipo = next(
+                    (fila[2] for fila in cursor.execute(f'PRAGMA table_info({tabla})')
+                     if fila[1] == 'timestamp'),
+                    'INTEGER'
                 )
-            ''')
-            
+                if tipo.upper() == 'INTEGER':
+                    continue
+
+                cols = [fila[1] for fila in cursor.execute(f'PRAGMA table_info({tabla})')]
+                # El COALESCE cubre los epochs guardados como texto en la
+                # columna vieja (strftime devuelve NULL para ellos)
+                origen = ', '.join(
+                    "CAST(COALESCE(strftime('%s', timestamp), timestamp) AS INTEGER)"
+                    if col == 'timestamp' else col
+                    for col in cols
+                )
+                cursor.execute('BEGIN')
+                cursor.execute(f'ALTER TABLE {tabla} RENAME TO {tabla}_legado')
+                cursor.execute(f'CREATE TABLE {tabla} {columnas}')
+                cursor.execute(
+                    f'INSERT INTO {tabla} ({", ".join(cols)}) '
+                    f'SELECT {origen} FROM {tabla}_legado'
+                )
+                cursor.execute(f'DROP TABLE {tabla}_legado')
+                cursor.execute('COMMIT')
+                self.logger.info(f"Tabla {tabla} migrada a timestamps epoch")
+
             # Índices para búsquedas rápidas
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp)')
-            
-            conn.commit()
-            conn.close()
-            
+
+            # Índices cubrientes: los agregados del reporte se resuelven
+            # leyendo solo páginas de índice, sin saltar a la tabla
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_metrics_ts_cov
+                ON metrics(timestamp, cpu_percent, memory_percent, disk_percent)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_alerts_ts_level
+                ON alerts(timestamp, level)
+            ''')
+
         except Exception as e:
             self.logger.error(f"Error inicializando base de datos: {e}")
     
+    def _discover_temp_path(self) -> Optional[str]:
+        """Localizar el archivo hwmon con la temperatura de la CPU"""
+        try:
+            for hwmon in sorted(os.listdir('/sys/class/hwmon')):
+                base = f"/sys/class/hwmon/{hwmon}"
+                try:
+                    with open(f"{base}/name") as f:
+                        nombre = f.read().strip()
+                except OSError:
+                    continue
+
+                if nombre in ('coretemp', 'k10temp', 'zenpower', 'cpu_thermal'):
+                    ruta = f"{base}/temp1_input"
+                    if os.path.exists(ruta):
+                        return ruta
+        except OSError:
+            pass
+        return None
+
+    def _read_loadavg(self) -> tuple:
+        """Load averages y nº de procesos con una lectura de /proc
+
+        El cuarto campo de /proc/loadavg cuenta entidades de
+        planificación del kernel (hilos incluidos), varias veces el nº
+        de procesos: usarlo redefiniría la métrica y dispararía
+        process_limit en falso. Los procesos se cuentan como entradas
+        numéricas de /proc; de /proc/loadavg solo se toman las tres
+        medias. Fallback a psutil fuera de Linux.
+        """
+        if _IS_LINUX:
+            try:
+                with open('/proc/loadavg', 'rb') as f:
+                    partes = f.read().split()
+                la1, la5, la15 = float(partes[0]), float(partes[1]), float(partes[2])
+                total = sum(1 for nombre in os.listdir('/proc') if nombre.isdigit())
+                return la1, la5, la15, total
+            except (OSError, ValueError, IndexError):
+                pass
+
+        la1, la5, la15 = psutil.getloadavg()
+        return la1, la5, la15, len(psutil.pids())
+
     def get_cpu_metrics(self) -> Dict[str, Any]:
         """Obtener métricas de CPU"""
         try:
-            # Porcentaje de uso
-            cpu_percent = psutil.cpu_percent(interval=1)
-            
-            # Temperatura (puede requerir privilegios)
+            # Porcentaje de uso desde la última lectura (no bloqueante)
+            cpu_percent = psutil.cpu_percent(interval=None)
+
+            # Temperatura: lectura directa del sensor cacheado
             cpu_temp = None
-            try:
-                if hasattr(psutil, "sensors_temperatures"):
-                    temps = psutil.sensors_temperatures()
-                    if 'coretemp' in temps:
-                        cpu_temp = temps['coretemp'][0].current
-            except:
-                pass
-            
-            # Load average
-            load_avg = psutil.getloadavg()
+            if self._temp_path:
+                try:
+                    with open(self._temp_path, 'rb') as f:
+                        cpu_temp = int(f.read()) / 1000.0
+                except (OSError, ValueError):
+                    self._temp_path = None  # sensor desaparecido
+
+            # Fallback a psutil si no se encontró sensor
+            if cpu_temp is None:
+                try:
+                    if hasattr(psutil, "sensors_temperatures"):
+                        temps = psutil.sensors_temperatures()
+                        if 'coretemp' in temps:
+                            cpu_temp = temps['coretemp'][0].current
+                except:
+                    pass
             
+            # Load average y nº de procesos en una sola lectura de /proc
+            la1, la5, la15, processes = self._read_loadavg()
+
             return {
                 "percent": cpu_percent,
                 "temperature": cpu_temp,
-                "load_avg_1min": load_avg[0],
-                "load_avg_5min": load_avg[1],
-                "load_avg_15min": load_avg[2]
+                "load_avg_1min": la1,
+                "load_avg_5min": la5,
+                "load_avg_15min": la15,
+                "processes": processes
             }
         except Exception as e:
             self.logger.error(f"Error obteniendo métricas de CPU: {e}")
@@ -278,13 +499,24 @@ class SystemMonitor:
             return {}
     
     def get_network_metrics(self) -> Dict[str, Any]:
-        """Obtener métricas de red"""
+        """Obtener métricas de red como tasas (MB/s) por delta de contadores"""
         try:
             net_io = psutil.net_io_counters()
-            
+            ahora = time.monotonic()
+            dt = ahora - self._prev_net_t
+
+            if dt > 0:
+                sent_mb_s = (net_io.bytes_sent - self._prev_net.bytes_sent) / dt / (1024**2)
+                recv_mb_s = (net_io.bytes_recv - self._prev_net.bytes_recv) / dt / (1024**2)
+            else:
+                sent_mb_s = recv_mb_s = 0.0
+
+            self._prev_net = net_io
+            self._prev_net_t = ahora
+
             return {
-                "sent_mb": net_io.bytes_sent / (1024**2),
-                "recv_mb": net_io.bytes_recv / (1024**2),
+                "sent_mb": sent_mb_s,
+                "recv_mb": recv_mb_s,
                 "packets_sent": net_io.packets_sent,
                 "packets_recv": net_io.packets_recv
             }
@@ -294,7 +526,14 @@ class SystemMonitor:
     
     def get_system_metrics(self) -> SystemMetrics:
         """Obtener todas las métricas del sistema"""
-        timestamp = datetime.now().isoformat()
+        ahora = time.monotonic()
+        if (self._last_metrics is not None
+                and ahora - self._last_ts < self._min_interval):
+            return self._last_metrics
+
+        # Epoch entero: 8 bytes en la DB y comparaciones de rango sin
+        # comparar texto ISO carácter a carácter
+        timestamp = int(time.time())
         
         # Obtener métricas individuales
         cpu_metrics = self.get_cpu_metrics()
@@ -302,9 +541,11 @@ class SystemMonitor:
         disk_metrics = self.get_disk_metrics()
         network_metrics = self.get_network_metrics()
         
-        # Obtener otras métricas
-        processes = len(psutil.pids())
-        uptime_seconds = time.time() - psutil.boot_time()
+        # Nº de procesos: ya viene contado junto a los load averages. (Si
+        # algún día se sacan métricas por proceso, iterar con
+        # psutil.process_iter([...]) y agrupar lecturas en p.oneshot().)
+        processes = cpu_metrics.get("processes", 0)
+        uptime_seconds = time.time() - self._boot_time
         
         # Crear objeto de métricas
         metrics = SystemMetrics(
@@ -328,129 +569,176 @@ class SystemMonitor:
         )
         
         # Guardar en historial
-        self.metrics_history.append(metrics)
-        if len(self.metrics_history) > self.max_history_size:
-            self.metrics_history.pop(0)
+        self._record_history(metrics)
         
         # Guardar en base de datos si está habilitado
         if self.config["monitoreo"]["guardar_historial"]:
             self._save_metrics_to_db(metrics)
-        
+
+        self._last_metrics = metrics
+        self._last_ts = ahora
         return metrics
     
+    def _record_history(self, metrics: SystemMetrics):
+        """Registrar la medición en el historial en memoria"""
+        if self._hist is None:
+            # Sin numpy: el deque desaloja el más antiguo solo
+            self.metrics_history.append(metrics)
+            return
+
+        fila = (
+            float(metrics.timestamp),
+            metrics.cpu_percent, metrics.cpu_temp or 0.0,
+            metrics.memory_percent, metrics.memory_used_gb,
+            metrics.memory_total_gb, metrics.disk_percent,
+            metrics.disk_used_gb, metrics.disk_total_gb,
+            metrics.swap_percent, metrics.network_sent_mb,
+            metrics.network_recv_mb, metrics.uptime_hours,
+            float(metrics.processes), metrics.load_avg_1min,
+            metrics.load_avg_5min, metrics.load_avg_15min
+        )
+        self._hist[self._hist_idx % self.max_history_size] = fila
+        self._hist_idx += 1
+
+    def history_stats(self) -> Dict[str, float]:
+        """Promedios y máximos de la ventana de historial en memoria"""
+        if self._hist is not None:
+            n = min(self._hist_idx, self.max_history_size)
+            if n == 0:
+                return {}
+            ventana = self._hist[:n]
+            return {
+                "avg_cpu": float(ventana[:, COL_CPU].mean()),
+                "max_cpu": float(ventana[:, COL_CPU].max()),
+                "avg_memory": float(ventana[:, COL_MEM].mean()),
+                "max_memory": float(ventana[:, COL_MEM].max()),
+                "avg_disk": float(ventana[:, COL_DISK].mean()),
+                "samples": float(n),
+            }
+
+        if not self.metrics_history:
+            return {}
+        cpus = [m.cpu_percent for m in self.metrics_history]
+        mems = [m.memory_percent for m in self.metrics_history]
+        disks = [m.disk_percent for m in self.metrics_history]
+        return {
+            "avg_cpu": sum(cpus) / len(cpus),
+            "max_cpu": max(cpus),
+            "avg_memory": sum(mems) / len(mems),
+            "max_memory": max(mems),
+            "avg_disk": sum(disks) / len(disks),
+            "samples": float(len(cpus)),
+        }
+
     def _save_metrics_to_db(self, metrics: SystemMetrics):
-        """Guardar métricas en base de datos"""
+        """Encolar métricas para el hilo escritor (no bloquea el muestreo)"""
+        fila = (
+            metrics.timestamp, metrics.cpu_percent, metrics.cpu_temp,
+            metrics.memory_percent, metrics.memory_used_gb,
+            metrics.memory_total_gb, metrics.disk_percent,
+            metrics.disk_used_gb, metrics.disk_total_gb,
+            metrics.swap_percent, metrics.network_sent_mb,
+            metrics.network_recv_mb, metrics.uptime_hours,
+            metrics.processes, metrics.load_avg_1min,
+            metrics.load_avg_5min, metrics.load_avg_15min
+        )
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO metrics (
-                    timestamp, cpu_percent, cpu_temp, memory_percent,
-                    memory_used_gb, memory_total_gb, disk_percent,
-                    disk_used_gb, disk_total_gb, swap_percent,
-                    network_sent_mb, network_recv_mb, uptime_hours,
-                    processes, load_avg_1min, load_avg_5min, load_avg_15min
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                metrics.timestamp, metrics.cpu_percent, metrics.cpu_temp,
-                metrics.memory_percent, metrics.memory_used_gb,
-                metrics.memory_total_gb, metrics.disk_percent,
-                metrics.disk_used_gb, metrics.disk_total_gb,
-                metrics.swap_percent, metrics.network_sent_mb,
-                metrics.network_recv_mb, metrics.uptime_hours,
-                metrics.processes, metrics.load_avg_1min,
-                metrics.load_avg_5min, metrics.load_avg_15min
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            self.logger.error(f"Error guardando métricas en DB: {e}")
+            self._write_q.put_nowait(("metric", fila))
+        except queue.Full:
+            self.logger.warning("Cola de escritura llena; métrica descartada")
+
+    def _writer_loop(self):
+        """Drenar la cola en lotes y confirmarlos en una transacción
+
+        Corre en un hilo propio: la latencia del disco la paga este hilo,
+        no el bucle de muestreo.
+        """
+        while not (self._writer_stop.is_set() and self._write_q.empty()):
+            try:
+                lote = [self._write_q.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+
+            while len(lote) < self._writer_batch:
+                try:
+                    lote.append(self._write_q.get_nowait())
+                except queue.Empty:
+                    break
+
+            metricas = [fila for tipo, fila in lote if tipo == "metric"]
+            alertas = [fila for tipo, fila in lote if tipo == "alert"]
+
+            try:
+                with self._db_lock:
+                    self._cur.execute("BEGIN")
+                    if metricas:
+                        self._cur.executemany(INSERT_METRIC_SQL, metricas)
+                    if alertas:
+                        self._cur.executemany(INSERT_ALERT_SQL, alertas)
+                    self._cur.execute("COMMIT")
+            except Exception as e:
+                try:
+                    self.conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                self.logger.error(f"Error guardando lote en DB: {e}")
+            finally:
+                for _ in lote:
+                    self._write_q.task_done()
+
+    def flush_metrics(self):
+        """Esperar a que el hilo escritor vacíe la cola pendiente"""
+        if self._writer_thread.is_alive():
+            self._write_q.join()
     
+    def _build_alert_specs(self) -> List[tuple]:
+        """Precalcular la tabla (fuente, atributo, umbral, nivel, formato)
+
+        Los umbrales se leen del config una sola vez; check_alerts queda
+        como una única pasada sobre la tabla. Reconstruir si se recarga
+        la configuración.
+        """
+        umbrales = self.config["umbrales"]
+        warning = lambda v: AlertLevel.WARNING
+        escalado = lambda v: AlertLevel.WARNING if v < 95 else AlertLevel.CRITICAL
+        critico = lambda v: AlertLevel.CRITICAL
+
+        return [
+            ("CPU", "cpu_percent", float(umbrales["cpu_percent"]),
+             escalado, "Uso de CPU elevado: {:.1f}%"),
+            ("CPU Temperature", "cpu_temp", float(umbrales["cpu_temp"]),
+             critico, "Temperatura crítica: {:.1f}°C"),
+            ("Memory", "memory_percent", float(umbrales["memory_percent"]),
+             escalado, "Memoria casi llena: {:.1f}%"),
+            ("Disk", "disk_percent", float(umbrales["disk_percent"]),
+             critico, "Disco casi lleno: {:.1f}%"),
+            ("Swap", "swap_percent", float(umbrales["swap_percent"]),
+             warning, "Uso de swap elevado: {:.1f}%"),
+            ("Load Average", "load_avg_5min", float(umbrales["load_avg_5min"]),
+             warning, "Load average elevado (5min): {:.2f}"),
+            ("Processes", "processes", float(umbrales["process_limit"]),
+             warning, "Número alto de procesos: {:.0f}"),
+        ]
+
     def check_alerts(self, metrics: SystemMetrics) -> List[Alert]:
-        """Verificar condiciones de alerta"""
+        """Verificar condiciones de alerta contra la tabla de umbrales"""
         alerts = []
-        umbrales = self.config["umbrales"]
-        
-        # Verificar CPU
-        if metrics.cpu_percent > umbrales["cpu_percent"]:
-            alerts.append(Alert(
-                level=AlertLevel.WARNING if metrics.cpu_percent < 95 else AlertLevel.CRITICAL,
-                source="CPU",
-                message=f"Uso de CPU elevado: {metrics.cpu_percent:.1f}%",
-                value=metrics.cpu_percent,
-                threshold=umbrales["cpu_percent"],
-                timestamp=metrics.timestamp
-            ))
-        
-        # Verificar temperatura CPU
-        if metrics.cpu_temp and metrics.cpu_temp > umbrales["cpu_temp"]:
-            alerts.append(Alert(
-                level=AlertLevel.CRITICAL,
-                source="CPU Temperature",
-                message=f"Temperatura crítica: {metrics.cpu_temp:.1f}°C",
-                value=metrics.cpu_temp,
-                threshold=umbrales["cpu_temp"],
-                timestamp=metrics.timestamp
-            ))
-        
-        # Verificar memoria
-        if metrics.memory_percent > umbrales["memory_percent"]:
-            alerts.append(Alert(
-                level=AlertLevel.WARNING if metrics.memory_percent < 95 else AlertLevel.CRITICAL,
-                source="Memory",
-                message=f"Memoria casi llena: {metrics.memory_percent:.1f}%",
-                value=metrics.memory_percent,
-                threshold=umbrales["memory_percent"],
-                timestamp=metrics.timestamp
-            ))
-        
-        # Verificar disco
-        if metrics.disk_percent > umbrales["disk_percent"]:
-            alerts.append(Alert(
-                level=AlertLevel.CRITICAL,
-                source="Disk",
-                message=f"Disco casi lleno: {metrics.disk_percent:.1f}%",
-                value=metrics.disk_percent,
-                threshold=umbrales["disk_percent"],
-                timestamp=metrics.timestamp
-            ))
-        
-        # Verificar swap
-        if metrics.swap_percent > umbrales["swap_percent"]:
-            alerts.append(Alert(
-                level=AlertLevel.WARNING,
-                source="Swap",
-                message=f"Uso de swap elevado: {metrics.swap_percent:.1f}%",
-                value=metrics.swap_percent,
-                threshold=umbrales["swap_percent"],
-                timestamp=metrics.timestamp
-            ))
-        
-        # Verificar load average
-        if metrics.load_avg_5min > umbrales["load_avg_5min"]:
-            alerts.append(Alert(
-                level=AlertLevel.WARNING,
-                source="Load Average",
-                message=f"Load average elevado (5min): {metrics.load_avg_5min:.2f}",
-                value=metrics.load_avg_5min,
-                threshold=umbrales["load_avg_5min"],
-                timestamp=metrics.timestamp
-            ))
-        
-        # Verificar número de procesos
-        if metrics.processes > umbrales["process_limit"]:
+
+        for source, attr, threshold, level_fn, fmt in self._alert_specs:
+            value = getattr(metrics, attr)
+            # cpu_temp puede ser None si no hay sensor
+            if value is None or value <= threshold:
+                continue
+            value = float(value)
             alerts.append(Alert(
-                level=AlertLevel.WARNING,
-                source="Processes",
-                message=f"Número alto de procesos: {metrics.processes}",
-                value=float(metrics.processes),
-                threshold=float(umbrales["process_limit"]),
+                level=level_fn(value),
+                source=source,
+                message=fmt.format(value),
+                value=value,
+                threshold=threshold,
                 timestamp=metrics.timestamp
             ))
-        
+
         return alerts
     
     def handle_alerts(self, alerts: List[Alert]):
@@ -463,101 +751,139 @@ class SystemMonitor:
             self.logger.warning("Límite diario de alertas alcanzado")
             return
         
+        # Guardar todas las alertas del ciclo en una sola transacción
+        self._save_alerts_bulk(alerts)
+
         for alert in alerts:
-            # Guardar alerta en base de datos
-            self._save_alert_to_db(alert)
-            
             # Incrementar contador
             self.alerts_today += 1
-            
+
             # Enviar notificación KDE
             if self.config["alertas"]["notificar_kde"]:
                 self._send_kde_notification(alert)
-            
-            # Enviar email si está configurado
-            if self.config["alertas"]["notificar_email"]:
-                self._send_email_alert(alert)
-            
+
             # Ejecutar acciones automáticas si es crítica
             if alert.level == AlertLevel.CRITICAL:
                 self._execute_automatic_actions(alert)
+
+        # Emails del ciclo en una sola sesión SMTP (un handshake TLS,
+        # no uno por alerta)
+        if self.config["alertas"]["notificar_email"]:
+            self._send_email_alerts_bulk(alerts)
     
-    def _save_alert_to_db(self, alert: Alert):
-        """Guardar alerta en base de datos"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO alerts (timestamp, level, source, message, value, threshold)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                alert.timestamp,
-                alert.level.value,
-                alert.source,
-                alert.message,
-                alert.value,
-                alert.threshold
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            self.logger.error(f"Error guardando alerta en DB: {e}")
+    def _save_alerts_bulk(self, alerts: List[Alert]):
+        """Encolar un lote de alertas para el hilo escritor"""
+        for alert in alerts:
+            try:
+                self._write_q.put_nowait((
+                    "alert",
+                    (alert.timestamp, alert.level.value, alert.source,
+                     alert.message, alert.value, alert.threshold)
+                ))
+            except queue.Full:
+                self.logger.warning("Cola de escritura llena; alerta descartada")
     
+    def _notify_dbus(self, title: str, message: str, icon: str) -> bool:
+        """Notificar vía D-Bus (org.freedesktop.Notifications)
+
+        La conexión se abre una vez y se reutiliza entre alertas.
+        Devuelve False si jeepney o el bus no están disponibles, para que
+        el llamante use el fallback de kdialog. jeepney se importa aquí
+        para no pagar el import en arranques que no notifican.
+        """
+        try:
+            from jeepney import DBusAddress, new_method_call
+            from jeepney.io.blocking import open_dbus_connection
+        except ImportError:
+            return False
+
+        try:
+            if self._dbus_conn is None:
+                self._dbus_conn = open_dbus_connection(bus='SESSION')
+
+            notificaciones = DBusAddress(
+                '/org/freedesktop/Notifications',
+                bus_name='org.freedesktop.Notifications',
+                interface='org.freedesktop.Notifications'
+            )
+            mensaje_dbus = new_method_call(
+                notificaciones, 'Notify', 'susssasa{sv}i',
+                ('monitor_sistema', 0, icon, title, message, [], {}, 10000)
+            )
+            self._dbus_conn.send_and_get_reply(mensaje_dbus)
+            return True
+        except Exception:
+            self._dbus_conn = None
+            return False
+
     def _send_kde_notification(self, alert: Alert):
         """Enviar notificación KDE"""
         try:
-            import subprocess
-            
             icon = "dialog-warning"
             if alert.level == AlertLevel.CRITICAL:
                 icon = "dialog-error"
             elif alert.level == AlertLevel.INFO:
                 icon = "dialog-information"
-            
+
             title = f"⚠️ Alerta del Sistema: {alert.source}"
             message = f"{alert.message}\nValor: {alert.value} | Umbral: {alert.threshold}"
-            
-            subprocess.run([
-                "kdialog", "--title", title,
-                "--icon", icon,
-                "--passivepopup", message, "10"
-            ])
-            
+
+            if self._notify_dbus(title, message, icon):
+                return
+
+            import subprocess
+            subprocess.run(
+                ["kdialog", "--title", title,
+                 "--icon", icon,
+                 "--passivepopup", message, "10"],
+                check=False,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
         except Exception as e:
             self.logger.error(f"Error enviando notificación KDE: {e}")
     
-    def _send_email_alert(self, alert: Alert):
-        """Enviar alerta por email"""
+    def _build_email_message(self, alert: Alert) -> str:
+        """Construir el mensaje de email para una alerta"""
+        subject = f"[{alert.level.value.upper()}] Alerta del Sistema: {alert.source}"
+        body = f"""
+        Alerta del Sistema Monitor
+
+        Nivel: {alert.level.value.upper()}
+        Fuente: {alert.source}
+        Mensaje: {alert.message}
+        Valor Actual: {alert.value}
+        Umbral: {alert.threshold}
+        Timestamp: {datetime.fromtimestamp(alert.timestamp).isoformat()}
+
+        Sistema: {os.uname().nodename}
+        """
+        return f"Subject: {subject}\n\n{body}"
+
+    def _send_email_alerts_bulk(self, alerts: List[Alert]):
+        """Enviar todas las alertas del ciclo en una sola sesión SMTP
+
+        El handshake STARTTLS+LOGIN (100-500ms) se paga una vez por
+        ráfaga, no una vez por alerta.
+        """
         try:
+            import smtplib
+
             config = self.config["alertas"]
-            
+
             if not all([config["smtp_username"], config["smtp_password"], config["email_to"]]):
                 return
-            
-            subject = f"[{alert.level.value.upper()}] Alerta del Sistema: {alert.source}"
-            body = f"""
-            Alerta del Sistema Monitor
-            
-            Nivel: {alert.level.value.upper()}
-            Fuente: {alert.source}
-            Mensaje: {alert.message}
-            Valor Actual: {alert.value}
-            Umbral: {alert.threshold}
-            Timestamp: {alert.timestamp}
-            
-            Sistema: {os.uname().nodename}
-            """
-            
-            msg = f"Subject: {subject}\n\n{body}"
-            
+
             with smtplib.SMTP(config["smtp_server"], config["smtp_port"]) as server:
                 server.starttls()
                 server.login(config["smtp_username"], config["smtp_password"])
-                server.sendmail(config["email_from"], config["email_to"], msg)
-                
+                for alert in alerts:
+                    server.sendmail(
+                        config["email_from"], config["email_to"],
+                        self._build_email_message(alert)
+                    )
+
         except Exception as e:
             self.logger.error(f"Error enviando email: {e}")
     
@@ -596,39 +922,36 @@ class SystemMonitor:
     def generate_report(self, hours: int = 24) -> Dict[str, Any]:
         """Generar reporte de las últimas horas"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Calcular timestamp límite
-            limit_time = (datetime.now() - timedelta(hours=hours)).isoformat()
-            
-            # Obtener métricas del período
+            # Asegurar que el buffer pendiente sea visible en el reporte
+            self.flush_metrics()
+
+            cursor = self.conn.cursor()
+
+            # Calcular timestamp límite (epoch entero)
+            limit_time = int(time.time()) - hours * 3600
+
+            # Métricas y alertas del período en una sola sentencia: un
+            # único viaje al motor, las alertas agrupadas salen como
+            # objeto JSON que se parsea en cliente
             cursor.execute('''
-                SELECT 
-                    AVG(cpu_percent) as avg_cpu,
-                    MAX(cpu_percent) as max_cpu,
-                    AVG(memory_percent) as avg_memory,
-                    MAX(memory_percent) as max_memory,
-                    AVG(disk_percent) as avg_disk,
-                    COUNT(*) as samples
-                FROM metrics 
+                WITH a AS (
+                    SELECT level, COUNT(*) AS c
+                    FROM alerts
+                    WHERE timestamp > ?
+                    GROUP BY level
+                )
+                SELECT
+                    AVG(cpu_percent), MAX(cpu_percent),
+                    AVG(memory_percent), MAX(memory_percent),
+                    AVG(disk_percent), COUNT(*),
+                    (SELECT json_group_object(level, c) FROM a)
+                FROM metrics
                 WHERE timestamp > ?
-            ''', (limit_time,))
-            
+            ''', (limit_time, limit_time))
+
             stats = cursor.fetchone()
-            
-            # Obtener alertas del período
-            cursor.execute('''
-                SELECT level, COUNT(*) as count
-                FROM alerts 
-                WHERE timestamp > ?
-                GROUP BY level
-            ''', (limit_time,))
-            
-            alert_counts = cursor.fetchall()
-            
-            conn.close()
-            
+            alert_counts = json.loads(stats[6]) if stats[6] else {}
+
             return {
                 "period_hours": hours,
                 "metrics": {
@@ -639,7 +962,7 @@ class SystemMonitor:
                     "avg_disk": stats[4] if stats[4] else 0,
                     "samples": stats[5] if stats[5] else 0
                 },
-                "alerts": {level: count for level, count in alert_counts},
+                "alerts": alert_counts,
                 "generated_at": datetime.now().isoformat()
             }
             
@@ -647,6 +970,35 @@ class SystemMonitor:
             self.logger.error(f"Error generando reporte: {e}")
             return {}
     
+    def prune_old_data(self):
+        """Eliminar métricas y alertas fuera de la ventana de retención
+
+        Sin poda, la tabla crece sin límite aunque la config tenga
+        historial_dias y los reportes pagan el escaneo de todo el
+        histórico para siempre.
+        """
+        try:
+            dias = self.config["monitoreo"]["historial_dias"]
+            cutoff = int(time.time()) - dias * 86400
+
+            with self._db_lock:
+                self._cur.execute("BEGIN")
+                self._cur.execute("DELETE FROM metrics WHERE timestamp < ?", (cutoff,))
+                borradas = self._cur.rowcount
+                self._cur.execute("DELETE FROM alerts WHERE timestamp < ?", (cutoff,))
+                self._cur.execute("COMMIT")
+                self.conn.execute("PRAGMA incremental_vacuum")
+
+            if borradas > 0:
+                self.logger.info(f"Retención: {borradas} métricas antiguas eliminadas")
+
+        except Exception as e:
+            try:
+                self.conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            self.logger.error(f"Error podando datos antiguos: {e}")
+
     def run_monitoring_cycle(self):
         """Ejecutar un ciclo completo de monitoreo"""
         self.logger.info("Iniciando ciclo de monitoreo...")
@@ -675,16 +1027,38 @@ class SystemMonitor:
         intervalo = self.config["monitoreo"]["intervalo_segundos"]
         
         self.logger.info(f"Iniciando monitoreo continuo (intervalo: {intervalo}s)")
-        
+
         try:
+            ciclos = 0
+            # Planificación por timestamp objetivo: dormir hasta next_t en
+            # vez de sleep(intervalo) tras el ciclo, que acumula deriva
+            next_t = time.monotonic()
             while True:
+                # Poda de retención al arrancar y cada 1000 ciclos
+                if ciclos % 1000 == 0:
+                    self.prune_old_data()
+                ciclos += 1
+
                 self.run_monitoring_cycle()
-                time.sleep(intervalo)
+
+                next_t += intervalo
+                restante = next_t - time.monotonic()
+                if restante > 0:
+                    time.sleep(restante)
+                else:
+                    # El ciclo tardó más que el intervalo: saltar al
+                    # siguiente objetivo en vez de encadenar retrasos
+                    self.logger.warning(
+                        f"Ciclo excedió el intervalo por {-restante:.1f}s"
+                    )
+                    next_t = time.monotonic()
                 
         except KeyboardInterrupt:
             self.logger.info("Monitoreo detenido por el usuario")
         except Exception as e:
             self.logger.error(f"Error en monitoreo continuo: {e}")
+        finally:
+            self.flush_metrics()
 
 def main():
     """Función principal"""
@@ -4,14 +4,51 @@ ORGANIZADOR AVANZADO DE DESCARGAS
 Versión Python con características avanzadas
 """
 import os
+import errno
+import mmap
 import shutil
 import json
 import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
 import mimetypes
 
+try:
+    import orjson  # opcional: serialización JSON mucho más rápida
+except ImportError:
+    orjson = None
+
+try:
+    from blake3 import blake3  # opcional: hash SIMD multihilo (~GB/s)
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash  # opcional: hash no criptográfico muy rápido
+except ImportError:
+    xxhash = None
+
+@dataclass
+class PlanEntry:
+    """Entrada del plan de organización: todo lo que la fase de ejecución
+    necesita de un archivo, resuelto en una sola pasada sobre scandir
+    (un único stat, un splitext, una clasificación). __slots__ mantiene
+    las entradas compactas en directorios con miles de archivos.
+    """
+    __slots__ = ("ruta", "nombre", "raiz", "extension", "tamano", "destino")
+    ruta: str
+    nombre: str
+    raiz: str
+    extension: str
+    tamano: int
+    destino: Path
+
+
 class OrganizadorAvanzado:
     def __init__(self, config_file: str = None):
         """Inicializar organizador con configuración"""
@@ -26,10 +63,60 @@ class OrganizadorAvanzado:
         # Cargar configuración
         self.config = self._cargar_configuracion(config_file)
         self.log_file = self.log_dir / f"organizador_avanzado_{datetime.now().strftime('%Y-%m-%d')}.log"
+
+        # fd de log persistente (se abre perezosamente) en modo O_APPEND:
+        # un write atómico por mensaje, sin buffer Python que perder si
+        # el proceso muere. La apertura va bajo lock: los workers del
+        # pool de hashing también registran y sin él dos hilos podían
+        # abrir el archivo a la vez, fugando un descriptor
+        self._log_fd = None
+        self._log_fd_lock = threading.Lock()
         
-        # Inicializar mimetypes
-        mimetypes.init()
-        
+        # Índice inverso extensión → (categoría, destino): una búsqueda
+        # de diccionario por archivo en vez de recorrer las categorías
+        self._ext_index = self._construir_indice_extensiones()
+
+        # Directorios ya creados en esta ejecución: evita repetir
+        # mkdir(parents=True) (3 syscalls) por cada archivo
+        self._created_dirs: set = set()
+
+        # Snapshot en memoria del contenido de cada destino: un getdents
+        # por carpeta en vez de un stat por archivo procesado. También
+        # sirve de reserva de nombres entre hilos del pool (bajo lock)
+        self._dest_lock = threading.Lock()
+        self._dest_contents: Dict[Path, set] = {}
+
+        # Opciones calientes ligadas una vez: un lookup de atributo por
+        # uso en vez de dos indexaciones de dict por archivo
+        opciones = self.config["opciones"]
+        self._verificar_duplicados = opciones["verificar_duplicados"]
+        self._organizar_por_fecha = opciones["organizar_por_fecha"]
+        self._usar_mimetype = opciones["usar_mimetype"]
+        # modo_rapido: mismo nombre + mismo tamaño cuenta como duplicado
+        # sin leer el contenido. Más rápido, con un riesgo mínimo de
+        # falso positivo; por eso es opt-in.
+        self._modo_rapido = opciones.get("modo_rapido", False)
+
+    def _asegurar_dir(self, destino: Path) -> Path:
+        """Crear el directorio solo la primera vez que se ve"""
+        if destino not in self._created_dirs:
+            destino.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(destino)
+        return destino
+
+    def _construir_indice_extensiones(self) -> Dict[str, tuple]:
+        """Aplanar categorías en un dict {extensión: (categoría, destino)}
+
+        Los Path de destino se resuelven aquí una sola vez, no por archivo.
+        """
+        indice: Dict[str, tuple] = {}
+        destinos = self.config["rutas"]["destinos"]
+        for categoria, extensiones in self.config["categorias"].items():
+            destino_base = Path(destinos[categoria])
+            for ext in extensiones:
+                indice[ext.lower()] = (categoria, destino_base)
+        return indice
+
     def _cargar_configuracion(self, config_file: Optional[str]) -> Dict:
         """Cargar configuración desde archivo JSON"""
         if config_file is None:
@@ -63,6 +150,7 @@ class OrganizadorAvanzado:
                 "organizar_por_fecha": True,
                 "usar_mimetype": True,
                 "verificar_duplicados": True,
+                "modo_rapido": False,
                 "crear_log": True,
                 "notificar_kde": True
             }
@@ -70,82 +158,305 @@ class OrganizadorAvanzado:
         
         if not config_path.exists():
             # Crear archivo de configuración por defecto
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config_default, f, indent=4, ensure_ascii=False)
+            if orjson:
+                config_path.write_bytes(
+                    orjson.dumps(config_default, option=orjson.OPT_INDENT_2)
+                )
+            else:
+                with open(config_path, 'w', encoding='utf-8') as f:
+                    json.dump(config_default, f, indent=4, ensure_ascii=False)
             print(f"📄 Configuración creada en: {config_path}")
             print("   Por favor, edita las rutas antes de usar.")
             return config_default
-        
+
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            datos = config_path.read_bytes()
+            return orjson.loads(datos) if orjson else json.loads(datos)
+        except ValueError:
             print(f"❌ Error en configuración. Usando valores por defecto.")
             return config_default
     
+    # Niveles que además salen por consola
+    _NIVELES_CONSOLA = frozenset(("ERROR", "WARN"))
+
     def _log(self, mensaje: str, nivel: str = "INFO"):
         """Registrar mensaje en log"""
         if not self.config["opciones"]["crear_log"]:
             return
-        
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # time.strftime sobre localtime() evita crear un objeto datetime
+        # por línea; en ejecuciones con cientos de "Movido" se nota
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
         log_entry = f"[{timestamp}] [{nivel}] {mensaje}\n"
-        
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-        
-        if nivel == "ERROR" or nivel == "WARN":
+
+        if self._log_fd is None:
+            with self._log_fd_lock:
+                if self._log_fd is None:
+                    self._log_fd = os.open(
+                        str(self.log_file),
+                        os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                        0o644
+                    )
+        os.write(self._log_fd, log_entry.encode('utf-8'))
+
+        if nivel in self._NIVELES_CONSOLA:
             print(f"[{nivel}] {mensaje}")
+
+    def cerrar_log(self):
+        """Cerrar el fd de log persistente"""
+        if self._log_fd is not None:
+            try:
+                os.close(self._log_fd)
+            finally:
+                self._log_fd = None
     
-    def _calcular_hash(self, ruta_archivo: Path) -> str:
-        """Calcular hash MD5 del archivo para detección de duplicados"""
-        hasher = hashlib.md5()
+    # Umbral a partir del cual conviene mapear el archivo en memoria
+    _MMAP_UMBRAL = 1 << 20  # 1 MiB
+
+    def _nuevo_hasher(self):
+        """Elegir el hash más rápido disponible para detección de duplicados
+
+        No se necesita fuerza criptográfica para dedup: BLAKE3 (SIMD,
+        multihilo) o xxh3 si están instalados; MD5 como último recurso.
+        """
+        if blake3 is not None:
+            return blake3()
+        if xxhash is not None:
+            return xxhash.xxh3_64()
+        return hashlib.md5()
+
+    def _calcular_hash(self, ruta_archivo: str) -> bytes:
+        """Calcular hash del archivo para detección de duplicados
+
+        Devuelve el digest en bytes crudos: comparar 16 bytes con memcmp
+        es más barato que 32 caracteres hex, y el dict de hashes ocupa la
+        mitad. Archivos grandes (ISOs, vídeos) se mapean con mmap y se
+        pasan al hasher en una sola llamada; los pequeños usan lecturas
+        con buffer de 1 MiB.
+        """
+        # BLAKE3 trae su propia vía mmap + multihilo interno
+        if blake3 is not None:
+            try:
+                hasher = blake3(max_threads=blake3.AUTO)
+                hasher.update_mmap(ruta_archivo)
+                return hasher.digest()
+            except Exception as e:
+                self._log(f"Error calculando hash: {e}", "ERROR")
+                return b""
+
+        hasher = self._nuevo_hasher()
         try:
             with open(ruta_archivo, 'rb') as f:
-                for bloque in iter(lambda: f.read(4096), b''):
+                tamano = os.fstat(f.fileno()).st_size
+
+                if tamano >= self._MMAP_UMBRAL:
+                    try:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            if hasattr(mm, 'madvise'):
+                                mm.madvise(mmap.MADV_SEQUENTIAL)
+                            hasher.update(mm)
+                        return hasher.digest()
+                    except (ValueError, OSError):
+                        # Archivo vacío o FS que no soporta mmap: seguir
+                        # con lecturas normales
+                        f.seek(0)
+
+                for bloque in iter(lambda: f.read(self._MMAP_UMBRAL), b''):
                     hasher.update(bloque)
-            return hasher.hexdigest()
+            return hasher.digest()
         except Exception as e:
             self._log(f"Error calculando hash: {e}", "ERROR")
-            return ""
+            return b""
     
-    def _detectar_tipo_mimetype(self, ruta_archivo: Path) -> Optional[str]:
-        """Detectar tipo de archivo usando mimetype"""
+    def _detectar_tipo_mimetype(self, ruta_archivo: str) -> Optional[str]:
+        """Detectar tipo de archivo usando mimetype
+
+        mimetypes.init() parsea /etc/mime.types (decenas de ms); se
+        difiere hasta el primer archivo que realmente cae en este
+        fallback — con extensiones conocidas no se paga nunca.
+        """
+        if not mimetypes.inited:
+            mimetypes.init()
         tipo_mime, _ = mimetypes.guess_type(ruta_archivo)
         if tipo_mime:
             return tipo_mime.split('/')[0]  # 'image', 'video', etc.
         return None
     
-    def _obtener_destino(self, archivo: Path, extension: str) -> Optional[Path]:
+    def _obtener_destino(self, archivo: str, extension: str,
+                         stat_archivo: Optional[os.stat_result] = None) -> Optional[Path]:
         """Determinar destino basado en extensión y tipo"""
         extension = extension.lower()
-        
-        # Primero buscar por extensión en categorías
-        for categoria, extensiones in self.config["categorias"].items():
-            if extension in extensiones:
-                destino_base = Path(self.config["rutas"]["destinos"][categoria])
-                
-                # Organizar por fecha si está habilitado
-                if self.config["opciones"]["organizar_por_fecha"] and categoria in ["imagenes", "videos"]:
-                    fecha = datetime.fromtimestamp(archivo.stat().st_mtime)
-                    destino = destino_base / fecha.strftime("%Y") / fecha.strftime("%m")
-                    destino.mkdir(parents=True, exist_ok=True)
-                    return destino
-                return destino_base
+
+        # Primero buscar por extensión en el índice precalculado
+        hit = self._ext_index.get(extension)
+        if hit:
+            categoria, destino_base = hit
+
+            # Organizar por fecha si está habilitado
+            if self._organizar_por_fecha and categoria in ("imagenes", "videos"):
+                if stat_archivo is None:
+                    stat_archivo = os.stat(archivo)
+                fecha = datetime.fromtimestamp(stat_archivo.st_mtime)
+                destino = destino_base / fecha.strftime("%Y") / fecha.strftime("%m")
+                return self._asegurar_dir(destino)
+            return destino_base
         
         # Si no se encontró por extensión, usar mimetype
-        if self.config["opciones"]["usar_mimetype"]:
+        if self._usar_mimetype:
             tipo_mime = self._detectar_tipo_mimetype(archivo)
             if tipo_mime:
                 destino_base = Path(self.config["rutas"]["destinos"]["otros"]) / tipo_mime
-                destino_base.mkdir(parents=True, exist_ok=True)
-                return destino_base
-        
+                return self._asegurar_dir(destino_base)
+
         # Por defecto, ir a "otros"
         destino_base = Path(self.config["rutas"]["destinos"]["otros"])
-        destino_base.mkdir(parents=True, exist_ok=True)
-        return destino_base
+        return self._asegurar_dir(destino_base)
     
+    def _contenido_destino(self, destino: Path) -> set:
+        """Snapshot cacheado de los nombres existentes en un destino"""
+        contenido = self._dest_contents.get(destino)
+        if contenido is None:
+            try:
+                contenido = set(os.listdir(destino))
+            except OSError:
+                contenido = set()
+            self._dest_contents[destino] = contenido
+        return contenido
+
+    def _notificar(self, titulo: str, mensaje: str):
+        """Enviar una notificación de escritorio
+
+        Primero por D-Bus (org.freedesktop.Notifications) sin fork/exec;
+        kdialog queda como fallback con la salida silenciada.
+        """
+        try:
+            from jeepney import DBusAddress, new_method_call
+            from jeepney.io.blocking import open_dbus_connection
+
+            with open_dbus_connection(bus='SESSION') as conexion:
+                notificaciones = DBusAddress(
+                    '/org/freedesktop/Notifications',
+                    bus_name='org.freedesktop.Notifications',
+                    interface='org.freedesktop.Notifications'
+                )
+                mensaje_dbus = new_method_call(
+                    notificaciones, 'Notify', 'susssasa{sv}i',
+                    ('organizador_avanzado', 0, 'dialog-information',
+                     titulo, mensaje, [], {}, 5000)
+                )
+                conexion.send_and_get_reply(mensaje_dbus)
+            return
+        except Exception:
+            pass
+
+        try:
+            import subprocess
+            subprocess.run(
+                ["kdialog", "--title", titulo, "--passivepopup", mensaje, "5"],
+                check=False,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except Exception:
+            pass  # Silenciar error si kdialog no está disponible
+
+    def _procesar_archivo(self, entrada: PlanEntry) -> Dict:
+        """Procesar una entrada del plan en el pool: dedup, renombrado
+        y movimiento
+
+        Todo lo que necesita viene resuelto en la PlanEntry — aquí no se
+        vuelve a hacer stat, splitext ni clasificación del origen.
+        Devuelve estadísticas parciales que el hilo principal fusiona; así
+        no hace falta un lock alrededor del dict global de estadísticas.
+        """
+        ruta_origen = entrada.ruta
+        nombre_archivo = entrada.nombre
+        raiz_nombre = entrada.raiz
+        extension = entrada.extension
+        tamano = entrada.tamano
+        destino = entrada.destino
+        resultado = {"movidos": 0, "duplicados": 0, "errores": 0, "hashes": {}}
+        verificar = self._verificar_duplicados
+
+        # Rutas como cadenas en el camino caliente: os.path es bastante
+        # más barato que construir objetos Path por archivo
+        dir_destino = str(destino)
+        nombre_dir = os.path.basename(dir_destino)
+
+        # Verificar duplicados por hash. El hash de origen se calcula una
+        # sola vez y se reutiliza tras el movimiento (el contenido no
+        # cambia, solo la ruta)
+        hash_origen = b""
+        nombre_final = nombre_archivo
+        nombre_destino = os.path.join(dir_destino, nombre_archivo)
+        contenido = self._contenido_destino(destino)
+        if verificar and nombre_archivo in contenido:
+            # Prefiltro por tamaño: si difieren no pueden ser duplicados
+            # y no hace falta leer ninguno de los dos
+            es_duplicado = False
+            try:
+                mismo_tamano = tamano == os.stat(nombre_destino).st_size
+            except OSError:
+                mismo_tamano = False  # snapshot desfasado: tratar como nuevo
+            if mismo_tamano:
+                if self._modo_rapido:
+                    # Nombre y tamaño idénticos bastan en modo rápido:
+                    # el caso "re-descarga del mismo archivo" queda en
+                    # un stat, sin leer 2×tamaño
+                    es_duplicado = True
+                else:
+                    hash_origen = self._calcular_hash(ruta_origen)
+                    hash_destino = self._calcular_hash(nombre_destino)
+                    es_duplicado = bool(hash_origen) and hash_origen == hash_destino
+
+            if es_duplicado:
+                resultado["duplicados"] = 1
+                self._log(f"Duplicado detectado y eliminado: {nombre_archivo}", "INFO")
+                try:
+                    os.unlink(ruta_origen)  # Eliminar duplicado
+                except OSError as e:
+                    resultado["errores"] = 1
+                    self._log(f"❌ Error eliminando {nombre_archivo}: {e}", "ERROR")
+                return resultado
+
+            # Renombrar si existe pero es diferente; la reserva en el
+            # snapshot bajo lock evita que dos workers elijan igual
+            with self._dest_lock:
+                contador = 1
+                while nombre_final in contenido:
+                    nombre_final = f"{raiz_nombre}_{contador}{extension}"
+                    contador += 1
+                contenido.add(nombre_final)
+                nombre_destino = os.path.join(dir_destino, nombre_final)
+
+        # Mover archivo: os.replace es un único renameat y cubre el caso
+        # habitual (Descargas y destino en el mismo sistema de archivos);
+        # shutil.move solo para movimientos entre dispositivos (EXDEV)
+        try:
+            try:
+                os.replace(ruta_origen, nombre_destino)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(ruta_origen, nombre_destino)
+            resultado["movidos"] = 1
+            contenido.add(nombre_final)  # mantener el snapshot al día
+            self._log(f"📁 Movido: {nombre_archivo} → {nombre_dir}")
+
+            # Registrar hash si está habilitado, reutilizando el ya
+            # calculado en la comprobación de duplicados si lo hubo
+            if verificar:
+                if not hash_origen:
+                    hash_origen = self._calcular_hash(nombre_destino)
+                if hash_origen:
+                    resultado["hashes"][nombre_destino] = hash_origen
+
+        except Exception as e:
+            resultado["errores"] = 1
+            self._log(f"❌ Error moviendo {nombre_archivo}: {e}", "ERROR")
+
+        return resultado
+
     def organizar(self):
         """Método principal de organización"""
         descargas = Path(self.config["rutas"]["descargas"])
@@ -164,62 +475,58 @@ class OrganizadorAvanzado:
             "hashes_calculados": {}
         }
         
-        for archivo in descargas.iterdir():
-            if not archivo.is_file():
-                continue
-            
-            estadisticas["total"] += 1
-            nombre_archivo = archivo.name
-            
-            # Saltar archivos ocultos y temporales
-            if nombre_archivo.startswith('.') or nombre_archivo.endswith('~'):
-                continue
-            
-            # Obtener extensión
-            extension = archivo.suffix
-            
-            # Obtener destino
-            destino = self._obtener_destino(archivo, extension)
-            
-            if not destino:
-                self._log(f"No se pudo determinar destino para: {nombre_archivo}", "WARN")
-                continue
-            
-            # Verificar duplicados por hash
-            nombre_destino = destino / nombre_archivo
-            if self.config["opciones"]["verificar_duplicados"] and nombre_destino.exists():
-                hash_origen = self._calcular_hash(archivo)
-                hash_destino = self._calcular_hash(nombre_destino)
-                
-                if hash_origen and hash_destino and hash_origen == hash_destino:
-                    estadisticas["duplicados"] += 1
-                    self._log(f"Duplicado detectado y eliminado: {nombre_archivo}", "INFO")
-                    archivo.unlink()  # Eliminar duplicado
+        # Pipeline productor/consumidor: el hilo principal enumera el
+        # directorio (scandir + stat + destino, barato) y va encolando en
+        # el pool, cuyos workers hacen el hash y el movimiento. La
+        # enumeración de metadatos se solapa así con la E/S de contenido
+        # — lo que más se nota en discos giratorios. Los métodos
+        # calientes se ligan a locales para sacar los lookups del bucle.
+        self._dest_contents.clear()  # snapshot fresco de los destinos
+        splitext = os.path.splitext
+        obtener_destino = self._obtener_destino
+        log = self._log
+        futuros = []
+        max_workers = min(8, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            submit = pool.submit
+            for entry in os.scandir(descargas):
+                if not entry.is_file(follow_symlinks=False):
                     continue
-                else:
-                    # Renombrar si existe pero es diferente
-                    contador = 1
-                    while nombre_destino.exists():
-                        nuevo_nombre = f"{archivo.stem}_{contador}{archivo.suffix}"
-                        nombre_destino = destino / nuevo_nombre
-                        contador += 1
-            
-            # Mover archivo
-            try:
-                shutil.move(str(archivo), str(nombre_destino))
-                estadisticas["movidos"] += 1
-                self._log(f"📁 Movido: {nombre_archivo} → {destino.name}")
-                
-                # Registrar hash si está habilitado
-                if self.config["opciones"]["verificar_duplicados"]:
-                    hash_archivo = self._calcular_hash(nombre_destino)
-                    if hash_archivo:
-                        estadisticas["hashes_calculados"][str(nombre_destino)] = hash_archivo
-                        
-            except Exception as e:
-                estadisticas["errores"] += 1
-                self._log(f"❌ Error moviendo {nombre_archivo}: {e}", "ERROR")
-        
+
+                estadisticas["total"] += 1
+                nombre_archivo = entry.name
+
+                # Saltar archivos ocultos y temporales
+                if nombre_archivo.startswith('.') or nombre_archivo.endswith('~'):
+                    continue
+
+                # Obtener extensión
+                raiz_nombre, extension = splitext(nombre_archivo)
+
+                # stat cacheado por el DirEntry: lo usan el destino por
+                # fecha y el prefiltro de duplicados
+                stat_archivo = entry.stat()
+
+                # Obtener destino
+                destino = obtener_destino(entry.path, extension, stat_archivo)
+
+                if not destino:
+                    log(f"No se pudo determinar destino para: {nombre_archivo}", "WARN")
+                    continue
+
+                futuros.append(submit(
+                    self._procesar_archivo,
+                    PlanEntry(entry.path, nombre_archivo, raiz_nombre,
+                              extension, stat_archivo.st_size, destino)
+                ))
+
+            for futuro in futuros:
+                resultado = futuro.result()
+                estadisticas["movidos"] += resultado["movidos"]
+                estadisticas["duplicados"] += resultado["duplicados"]
+                estadisticas["errores"] += resultado["errores"]
+                estadisticas["hashes_calculados"].update(resultado["hashes"])
+
         # Mostrar resumen
         self._log("=== RESUMEN ===")
         self._log(f"Total procesados: {estadisticas['total']}")
@@ -229,15 +536,12 @@ class OrganizadorAvanzado:
         
         # Notificación KDE
         if self.config["opciones"]["notificar_kde"] and estadisticas['movidos'] > 0:
-            try:
-                import subprocess
-                subprocess.run([
-                    "kdialog", "--title", "Organizador Avanzado",
-                    "--passivepopup", f"✅ Organizados {estadisticas['movidos']} archivos", "5"
-                ])
-            except Exception:
-                pass  # Silenciar error si kdialog no está disponible
-        
+            self._notificar(
+                "Organizador Avanzado",
+                f"✅ Organizados {estadisticas['movidos']} archivos"
+            )
+
+        self.cerrar_log()
         return estadisticas
 
 def main():
@@ -4,21 +4,111 @@ PROGRAMADOR DE TAREAS CON INTERFAZ PARA KDE PLASMA
 Versión mejorada con base de datos, interfaz web y múltiples triggers
 """
 import os
+import re
 import sys
 import json
+import argparse
 import sqlite3
 import subprocess
 import threading
-import schedule
+import queue
+import heapq
+import itertools
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache
 from enum import Enum
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import shlex
+import atexit
 import hashlib
 import pickle
+import zlib
+import struct
+import select
+import selectors
+import signal
+
+try:
+    # opcional: notificaciones de archivos a nivel de kernel (inotify);
+    # sin él se usa el sondeo por hash como fallback
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+try:
+    import orjson  # opcional: serialización JSON mucho más rápida
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard  # opcional: compresión más rápida de las salidas
+except ImportError:
+    zstandard = None
+
+
+def _json_dumps(obj) -> str:
+    """Serializar a JSON con orjson si está disponible"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+def _json_loads(data):
+    """Deserializar JSON con orjson (decodificación en C) si está disponible"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Salidas mayores que esto se persisten comprimidas (BLOB) y en memoria
+# solo queda el prefijo para mostrar
+_SALIDA_COMPRIMIR = 4096
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def _comprimir_salida(texto: str) -> bytes:
+    """Comprimir la salida de una tarea para persistirla como BLOB"""
+    datos = texto.encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(datos)
+    return zlib.compress(datos, 6)
+
+
+def _descomprimir_salida(blob: bytes) -> str:
+    """Recuperar una salida comprimida (zstd o zlib, según cabecera)"""
+    if blob[:4] == _ZSTD_MAGIC:
+        if zstandard is None:
+            return "[Salida comprimida con zstd: instala zstandard para leerla]"
+        return zstandard.ZstdDecompressor().decompress(blob).decode(
+            'utf-8', errors='replace'
+        )
+    return zlib.decompress(blob).decode('utf-8', errors='replace')
+
+
+@lru_cache(maxsize=4)
+def _iso_from_sec(segundos: int) -> str:
+    """Parte de segundos de un timestamp ISO, memoizada por segundo"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(segundos))
+
+
+def _fast_iso(t: Optional[float] = None) -> str:
+    """Timestamp ISO sin construir un datetime por llamada
+
+    La parte del segundo se formatea una vez por segundo (lru_cache) y
+    solo los microsegundos se calculan por llamada; mucho más barato que
+    isoformat() sobre un datetime nuevo en caminos calientes.
+    """
+    if t is None:
+        t = time.time()
+    segundos = int(t)
+    return f"{_iso_from_sec(segundos)}.{int((t - segundos) * 1e6):06d}"
 
 class TaskStatus(Enum):
     PENDING = "pending"
@@ -39,9 +129,21 @@ class TriggerType(Enum):
     FILE_CHANGE = "file_change"
     SYSTEM_EVENT = "system_event"
 
-@dataclass
+
+# Tablas valor → miembro precalculadas: un acceso de dict en vez del
+# __call__ de Enum (varias llamadas de Python) por fila reconstruida
+_TASK_STATUS = {s.value: s for s in TaskStatus}
+_TASK_TYPE = {t.value: t for t in TaskType}
+_TRIGGER_TYPE = {t.value: t for t in TriggerType}
+
+@dataclass(slots=True)
 class Task:
-    """Estructura de tarea programada"""
+    """Estructura de tarea programada
+
+    Con slots cada instancia prescinde del __dict__ (~300 bytes menos) y
+    el acceso a atributos va por descriptor: importa con miles de tareas
+    pendientes viviendo en el montículo del scheduler.
+    """
     id: Optional[int] = None
     name: str = ""
     description: str = ""
@@ -61,16 +163,204 @@ class Task:
     notify_on_completion: bool = True
     max_retries: int = 3
     retry_count: int = 0
-    
+    # Ejecutar vía /bin/sh solo si el creador lo pide explícitamente
+    # (tuberías, globs...); por defecto el comando se parte con shlex
+    # y se ejecuta sin el proceso sh intermedio
+    use_shell: bool = False
+    # JSON cacheado de los campos compuestos: se serializan una vez por
+    # tarea, no en cada UPDATE de estado (campos internos, fuera del
+    # constructor y del repr)
+    _args_json: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _trigger_json: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _argv: Optional[List[str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # Salida completa comprimida cuando excede _SALIDA_COMPRIMIR; en
+    # output queda solo el prefijo para mostrar
+    _output_z: Optional[bytes] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # Runner especializado según task_type, ligado en schedule_task: la
+    # cadena if/elif sobre el Enum se paga una vez al programar, no en
+    # cada ejecución
+    _run: Optional[Any] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
     def __post_init__(self):
         if self.arguments is None:
             self.arguments = []
         if self.trigger_data is None:
             self.trigger_data = {}
 
-class TaskScheduler:
+    def args_json(self) -> str:
+        """JSON de arguments, serializado perezosamente y cacheado"""
+        if self._args_json is None:
+            self._args_json = _json_dumps(self.arguments)
+        return self._args_json
+
+    def trigger_json(self) -> str:
+        """JSON de trigger_data, serializado perezosamente y cacheado"""
+        if self._trigger_json is None:
+            self._trigger_json = _json_dumps(self.trigger_data)
+        return self._trigger_json
+
+    def invalidate_json(self):
+        """Descartar el JSON cacheado tras reasignar arguments/trigger_data"""
+        self._args_json = None
+        self._trigger_json = None
+        self._argv = None
+
+    def argv(self) -> List[str]:
+        """Comando como lista de argumentos, parseado una sola vez
+
+        shlex.split respeta comillas y escapes; el resultado se cachea
+        para que el parseo quede fuera del camino caliente de ejecución.
+        """
+        if self._argv is None:
+            self._argv = shlex.split(self.command) + list(self.arguments)
+        return self._argv
+
+
+
+# Código del worker Python persistente para TaskType.SCRIPT: un bucle
+# que recibe (ruta, args, cwd) picklizados por stdin, ejecuta el script
+# en el propio proceso con runpy (sin pagar el arranque del intérprete
+# por ejecución) y devuelve (returncode, stdout, stderr) por stdout.
+_PY_WORKER_CODE = r"""
+import sys, os, io, pickle, struct, runpy, traceback
+inp = sys.stdin.buffer
+# Canal del protocolo en un fd propio: fd 1 pasa a /dev/null para que
+# los procesos nietos del script (o cualquier write a nivel C) no
+# corrompan los marcos pickle con prefijo de longitud
+proto_fd = os.dup(1)
+os.set_inheritable(proto_fd, False)
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+os.close(devnull)
+outp = os.fdopen(proto_fd, 'wb', buffering=0)
+
+LIMITE = 1024 * 1024  # mismo tope que TaskScheduler._SALIDA_MAX
+
+class Acotado(io.StringIO):
+    # Captura con tope: un script en bucle no acumula gigas en memoria
+    # del worker ni los pickliza de vuelta al scheduler
+    def __init__(self):
+        super().__init__()
+        self.restante = LIMITE
+    def write(self, s):
+        if self.restante > 0:
+            recorte = s[:self.restante]
+            super().write(recorte)
+            self.restante -= len(recorte)
+        return len(s)
+
+while True:
+    hdr = inp.read(4)
+    if len(hdr) < 4:
+        break
+    ruta, args, cwd = pickle.loads(inp.read(struct.unpack('>I', hdr)[0]))
+    rc, out, err = 0, Acotado(), Acotado()
+    argv_orig, cwd_orig = sys.argv, os.getcwd()
+    sys.argv = [ruta] + list(args)
+    sys.stdout, sys.stderr = out, err
+    try:
+        if cwd:
+            os.chdir(cwd)
+        runpy.run_path(ruta, run_name='__main__')
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            rc = e.code
+        elif e.code is not None:
+            rc = 1
+    except BaseException:
+        traceback.print_exc()
+        rc = 1
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        sys.argv = argv_orig
+        try:
+            os.chdir(cwd_orig)
+        except OSError:
+            pass
+    payload = pickle.dumps((rc, out.getvalue(), err.getvalue()))
+    outp.write(struct.pack('>I', len(payload)) + payload)
+    outp.flush()
+"""
+
+
+class _PyWorker:
+    """Proceso Python persistente que ejecuta scripts sin re-arrancar
+
+    Cada subprocess.run([sys.executable, ...]) paga el arranque frío del
+    intérprete (~30-150 ms); este worker lo paga una vez y luego ejecuta
+    cada script con runpy dentro del mismo proceso.
+    """
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, '-u', '-c', _PY_WORKER_CODE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0
+        )
+
+    def run(self, ruta: str, args: List[str], cwd: str,
+            timeout: float = 300) -> tuple:
+        """Ejecutar un script en el worker y devolver (rc, stdout, stderr)"""
+        payload = pickle.dumps((ruta, list(args or []), cwd))
+        self.proc.stdin.write(struct.pack('>I', len(payload)) + payload)
+        self.proc.stdin.flush()
+        limite = time.monotonic() + timeout
+        cabecera = self._read_exact(4, limite, timeout)
+        (n,) = struct.unpack('>I', cabecera)
+        return pickle.loads(self._read_exact(n, limite, timeout))
+
+    def _read_exact(self, n: int, limite: float, timeout: float) -> bytes:
+        """Leer exactamente n bytes del worker con fecha límite"""
+        datos = b''
+        fd = self.proc.stdout.fileno()
+        while len(datos) < n:
+            restante = limite - time.monotonic()
+            if restante <= 0 or not select.select([fd], [], [], restante)[0]:
+                self.close()
+                raise subprocess.TimeoutExpired("py-worker", timeout)
+            trozo = os.read(fd, n - len(datos))
+            if not trozo:
+                raise RuntimeError("Worker Python terminado inesperadamente")
+            datos += trozo
+        return datos
+
+    def close(self):
+        """Matar el proceso worker"""
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=1)
+        except Exception:
+            pass
+
+
+class TaskDB:
+    """Capa de persistencia del programador (config, logging y SQLite)
+
+    Base ligera suficiente para los comandos de un solo uso (cleanup,
+    list) lanzados desde cron: no arranca pool de ejecución, workers
+    Python, ni estado del scheduler.
+    """
+
+    # UPDATE reducido para el camino caliente de ejecución: solo los
+    # campos que cambian al ejecutar, sin re-serializar el resto
+    _UPDATE_STATUS_SQL = (
+        "UPDATE tasks SET status = ?, executed_at = ?, "
+        "result_code = ?, output = ?, output_z = ? WHERE id = ?"
+    )
+
     def __init__(self, config_file: str = None):
-        """Inicializar programador de tareas"""
+        """Inicializar configuración, logging y base de datos"""
         self.home = Path.home()
         self.config_dir = self.home / ".config" / "automatizacion_kde"
         self.log_dir = self.home / ".local" / "log" / "automatizacion"
@@ -86,31 +376,48 @@ class TaskScheduler:
         
         # Cargar configuración
         self.config = self._load_config(config_file)
-        
+
         # Inicializar base de datos
         self.db_path = self.db_dir / "task_scheduler.db"
         self._init_database()
-        
-        # Scheduler
-        self.scheduler = schedule.Scheduler()
-        self.running = False
-        self.scheduler_thread = None
-        
-        # Cache de hashes para detección de cambios
-        self.file_hashes = {}
-        
+
+        # Hilo escritor de logs de ejecución: los INSERT se encolan y se
+        # agrupan en un executemany por lote, sacando el fsync del camino
+        # crítico de _execute_task
+        self._log_queue: queue.Queue = queue.Queue()
+        self._log_writer_thread = threading.Thread(
+            target=self._log_writer_loop, daemon=True
+        )
+        self._log_writer_thread.start()
+
     def _setup_logging(self):
-        """Configurar sistema de logging"""
+        """Configurar sistema de logging
+
+        Los logger.info/error del pool de tareas solo encolan el registro
+        (QueueHandler, no bloqueante); el write+flush real lo hace un
+        QueueListener en su propio hilo, así los hilos de ejecución no
+        compiten por el lock del FileHandler.
+        """
         log_file = self.log_dir / f"task_scheduler_{datetime.now().strftime('%Y-%m')}.log"
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)
-            ]
+
+        formato = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
+        manejador_archivo = logging.FileHandler(log_file, encoding='utf-8')
+        manejador_archivo.setFormatter(formato)
+        manejador_consola = logging.StreamHandler(sys.stdout)
+        manejador_consola.setFormatter(formato)
+
+        self._log_q: queue.Queue = queue.Queue(-1)
+        self._log_listener = QueueListener(
+            self._log_q, manejador_archivo, manejador_consola
+        )
+        self._log_listener.start()
+
+        raiz = logging.getLogger()
+        raiz.setLevel(logging.INFO)
+        raiz.handlers.clear()
+        raiz.addHandler(QueueHandler(self._log_q))
         self.logger = logging.getLogger('TaskScheduler')
         
     def _load_config(self, config_file: Optional[str]) -> Dict:
@@ -126,12 +433,12 @@ class TaskScheduler:
                 "check_interval_seconds": 60,
                 "max_concurrent_tasks": 3,
                 "cleanup_completed_days": 30,
-                "enable_web_interface": false,
+                "enable_web_interface": False,
                 "web_port": 8080
             },
             "notifications": {
-                "notify_kde": true,
-                "notify_email": false,
+                "notify_kde": True,
+                "notify_email": False,
                 "email_from": "scheduler@dominio.com",
                 "email_to": "user@dominio.com",
                 "notification_sound": "/usr/share/sounds/freedesktop/stereo/complete.oga"
@@ -145,10 +452,10 @@ class TaskScheduler:
                     "rm -rf /", "dd if=/dev/random",
                     "mkfs", "shutdown", "reboot"
                 ],
-                "require_confirmation": true
+                "require_confirmation": True
             },
             "backup": {
-                "backup_before_run": false,
+                "backup_before_run": False,
                 "backup_dir": "~/.local/backup_tasks",
                 "keep_backups": 7
             }
@@ -161,18 +468,43 @@ class TaskScheduler:
             return config_default
         
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # Una sola lectura + parseo en C (orjson) al arrancar; el
+            # archivo sigue siendo JSON editable a mano
+            return _json_loads(config_path.read_bytes())
         except Exception as e:
             self.logger.error(f"Error cargando configuración: {e}")
             return config_default
     
     def _init_database(self):
-        """Inicializar base de datos SQLite"""
+        """Inicializar base de datos SQLite
+
+        Una única conexión de escritura persistente (bajo lock) y un
+        pequeño pool de conexiones de solo lectura: abrir y cerrar una
+        conexión por operación cuesta cientos de µs y serializa todo
+        tras el journal por defecto. Con WAL los lectores y el escritor
+        no se bloquean entre sí.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            self._db_write_lock = threading.Lock()
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None
+            )
+            self._db_writer = conn
             cursor = conn.cursor()
-            
+
+            # Pragmas de rendimiento: WAL + fsync relajado (durabilidad
+            # suficiente para un programador de tareas de escritorio)
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            cursor.execute('PRAGMA busy_timeout=5000')
+            # 20 MiB de cache de páginas: las consultas repetidas del
+            # historial de logs no vuelven a disco
+            cursor.execute('PRAGMA cache_size=-20000')
+            # Lecturas por mmap (hasta 256 MiB): páginas servidas desde
+            # el page cache del kernel sin syscall read por página
+            cursor.execute('PRAGMA mmap_size=268435456')
+
             # Tabla de tareas
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -194,7 +526,9 @@ class TaskScheduler:
                     enabled INTEGER DEFAULT 1,
                     notify_on_completion INTEGER DEFAULT 1,
                     max_retries INTEGER DEFAULT 3,
-                    retry_count INTEGER DEFAULT 0
+                    retry_count INTEGER DEFAULT 0,
+                    output_z BLOB,
+                    use_shell INTEGER DEFAULT 0
                 )
             ''')
             
@@ -207,9 +541,41 @@ class TaskScheduler:
                     duration_seconds REAL,
                     result_code INTEGER,
                     output TEXT,
+                    output_z BLOB,
+                    execution_ts INTEGER,
                     FOREIGN KEY (task_id) REFERENCES tasks (id)
                 )
             ''')
+
+            # Migración de bases anteriores: la columna comprimida se
+            # añade si falta (output sigue existiendo para compatibilidad
+            # de lectura con salidas guardadas en claro)
+            for tabla in ('tasks', 'execution_logs'):
+                try:
+                    cursor.execute(f'ALTER TABLE {tabla} ADD COLUMN output_z BLOB')
+                except sqlite3.OperationalError:
+                    pass  # la columna ya existe
+
+            # Timestamp numérico para la limpieza: comparar un entero de
+            # 8 bytes contra el índice en vez de una cadena ISO de 19+
+            # caracteres por fila. Las filas antiguas se rellenan una vez
+            try:
+                cursor.execute('ALTER TABLE execution_logs ADD COLUMN execution_ts INTEGER')
+            except sqlite3.OperationalError:
+                pass  # la columna ya existe
+
+            # Flag de ejecución vía shell (tuberías, globs): sin columna
+            # propia el valor del dataclass se perdía al guardar
+            try:
+                cursor.execute('ALTER TABLE tasks ADD COLUMN use_shell INTEGER DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass  # la columna ya existe
+            cursor.execute('''
+                UPDATE execution_logs
+                SET execution_ts = CAST(strftime('%s', execution_time) AS INTEGER)
+                WHERE execution_ts IS NULL
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_ts ON execution_logs(execution_ts)')
             
             # Tabla de dependencias
             cursor.execute('''
@@ -225,116 +591,209 @@ class TaskScheduler:
             # Índices
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_scheduled ON tasks(scheduled_for)')
+            # Cubre el listado filtrado por estado + ordenado por fecha
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_sched ON tasks(status, scheduled_for)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_task_id ON execution_logs(task_id)')
-            
-            conn.commit()
-            conn.close()
-            
+            # Índices para la limpieza periódica: búsqueda por fecha en
+            # los logs, y un índice parcial solo sobre tareas terminadas
+            # (las únicas que se borran) en vez de indexar toda la tabla
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_time ON execution_logs(execution_time)')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tasks_status_exec
+                ON tasks(status, executed_at)
+                WHERE status IN ('completed', 'failed', 'cancelled')
+            ''')
+            # Historial por tarea ya ordenado por fecha descendente:
+            # la consulta "últimas ejecuciones de X" es un recorrido de
+            # rango del índice, sin sort posterior
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_task_time ON execution_logs(task_id, execution_time DESC)')
+
+            # Autochequeo del plan de la limpieza: si el planificador
+            # deja de usar los índices de fecha (estadísticas de ANALYZE
+            # desfasadas, columnas nuevas), avisar al arrancar antes de
+            # que la regresión sea un barrido completo en producción
+            chequeos = (
+                ("SELECT rowid FROM execution_logs WHERE execution_ts < ?",
+                 'idx_logs_ts'),
+                ("SELECT rowid FROM tasks WHERE status IN "
+                 "('completed', 'failed', 'cancelled') AND executed_at < ?",
+                 'idx_tasks_status_exec'),
+            )
+            for consulta, indice in chequeos:
+                plan = cursor.execute(
+                    'EXPLAIN QUERY PLAN ' + consulta, (0,)
+                ).fetchall()
+                if not any(indice in str(fila) for fila in plan):
+                    self.logger.warning(
+                        f"La limpieza no usaría el índice {indice}: {plan}"
+                    )
+
+            # Pool de lectores: las consultas (list_tasks, cargas) no
+            # compiten por el lock de escritura
+            self._db_readers: queue.Queue = queue.Queue()
+            for _ in range(3):
+                lector = sqlite3.connect(self.db_path, check_same_thread=False)
+                lector.execute('PRAGMA busy_timeout=5000')
+                lector.execute('PRAGMA query_only=1')
+                self._db_readers.put(lector)
+
+            # Cierre ordenado al salir: descarga el checkpoint WAL
+            # pendiente en vez de dejarlo para la próxima apertura
+            atexit.register(self._close_db)
+
         except Exception as e:
             self.logger.error(f"Error inicializando base de datos: {e}")
-    
+
+    def _close_db(self):
+        """Cerrar las conexiones persistentes (escritor y lectores)"""
+        try:
+            with self._db_write_lock:
+                self._db_writer.close()
+            while True:
+                try:
+                    self._db_readers.get_nowait().close()
+                except queue.Empty:
+                    break
+        except Exception:
+            pass
+
+    @contextmanager
+    def _checkout_reader(self):
+        """Prestar una conexión de solo lectura del pool"""
+        conn = self._db_readers.get()
+        try:
+            yield conn
+        finally:
+            self._db_readers.put(conn)
+
     def _save_task_to_db(self, task: Task) -> int:
         """Guardar tarea en base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if task.id is None:
-                # Nueva tarea
-                cursor.execute('''
-                    INSERT INTO tasks (
-                        name, description, task_type, command, arguments,
-                        working_dir, trigger_type, trigger_data, status,
-                        created_at, scheduled_for, enabled, notify_on_completion,
-                        max_retries, retry_count
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    task.name,
-                    task.description,
-                    task.task_type.value,
-                    task.command,
-                    json.dumps(task.arguments),
-                    task.working_dir,
-                    task.trigger_type.value,
-                    json.dumps(task.trigger_data),
-                    task.status.value,
-                    task.created_at or datetime.now().isoformat(),
-                    task.scheduled_for,
-                    1 if task.enabled else 0,
-                    1 if task.notify_on_completion else 0,
-                    task.max_retries,
-                    task.retry_count
-                ))
-                task.id = cursor.lastrowid
-            else:
-                # Actualizar tarea existente
-                cursor.execute('''
-                    UPDATE tasks SET
-                        name = ?, description = ?, task_type = ?, command = ?,
-                        arguments = ?, working_dir = ?, trigger_type = ?,
-                        trigger_data = ?, status = ?, scheduled_for = ?,
-                        enabled = ?, notify_on_completion = ?, max_retries = ?,
-                        retry_count = ?
-                    WHERE id = ?
-                ''', (
-                    task.name,
-                    task.description,
-                    task.task_type.value,
-                    task.command,
-                    json.dumps(task.arguments),
-                    task.working_dir,
-                    task.trigger_type.value,
-                    json.dumps(task.trigger_data),
-                    task.status.value,
-                    task.scheduled_for,
-                    1 if task.enabled else 0,
-                    1 if task.notify_on_completion else 0,
-                    task.max_retries,
-                    task.retry_count,
-                    task.id
-                ))
-            
-            conn.commit()
-            conn.close()
+            with self._db_write_lock:
+                cursor = self._db_writer.cursor()
+
+                if task.id is None:
+                    # Nueva tarea
+                    cursor.execute('''
+                        INSERT INTO tasks (
+                            name, description, task_type, command, arguments,
+                            working_dir, trigger_type, trigger_data, status,
+                            created_at, scheduled_for, enabled, notify_on_completion,
+                            max_retries, retry_count, use_shell
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        task.name,
+                        task.description,
+                        task.task_type.value,
+                        task.command,
+                        task.args_json(),
+                        task.working_dir,
+                        task.trigger_type.value,
+                        task.trigger_json(),
+                        task.status.value,
+                        task.created_at or _fast_iso(),
+                        task.scheduled_for,
+                        1 if task.enabled else 0,
+                        1 if task.notify_on_completion else 0,
+                        task.max_retries,
+                        task.retry_count,
+                        1 if task.use_shell else 0
+                    ))
+                    task.id = cursor.lastrowid
+                else:
+                    # Actualizar tarea existente
+                    cursor.execute('''
+                        UPDATE tasks SET
+                            name = ?, description = ?, task_type = ?, command = ?,
+                            arguments = ?, working_dir = ?, trigger_type = ?,
+                            trigger_data = ?, status = ?, scheduled_for = ?,
+                            enabled = ?, notify_on_completion = ?, max_retries = ?,
+                            retry_count = ?, use_shell = ?
+                        WHERE id = ?
+                    ''', (
+                        task.name,
+                        task.description,
+                        task.task_type.value,
+                        task.command,
+                        task.args_json(),
+                        task.working_dir,
+                        task.trigger_type.value,
+                        task.trigger_json(),
+                        task.status.value,
+                        task.scheduled_for,
+                        1 if task.enabled else 0,
+                        1 if task.notify_on_completion else 0,
+                        task.max_retries,
+                        task.retry_count,
+                        1 if task.use_shell else 0,
+                        task.id
+                    ))
+
             return task.id
             
         except Exception as e:
             self.logger.error(f"Error guardando tarea en DB: {e}")
             return -1
     
+    def _update_status(self, task: Task):
+        """Actualizar solo los campos de estado de una tarea
+
+        _run_task guarda la tarea hasta cuatro veces por ejecución; el
+        UPDATE completo re-vincula 15 columnas (JSON incluido) cuando
+        aquí solo cambian estado, resultado y salida.
+        """
+        try:
+            with self._db_write_lock:
+                self._db_writer.execute(self._UPDATE_STATUS_SQL, (
+                    task.status.value,
+                    task.executed_at,
+                    task.result_code,
+                    task.output,
+                    task._output_z,
+                    task.id
+                ))
+        except Exception as e:
+            self.logger.error(f"Error actualizando estado de tarea: {e}")
+
     def _load_task_from_db(self, task_id: int) -> Optional[Task]:
         """Cargar tarea desde base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-            row = cursor.fetchone()
-            conn.close()
-            
+            with self._checkout_reader() as conn:
+                row = conn.execute(
+                    'SELECT * FROM tasks WHERE id = ?', (task_id,)
+                ).fetchone()
+
             if not row:
                 return None
-            
+
+            # Preferir la salida completa comprimida si existe; si no,
+            # el texto en claro de versiones anteriores
+            salida = (
+                _descomprimir_salida(row[19]) if len(row) > 19 and row[19]
+                else (row[14] if row[14] else "")
+            )
+
             return Task(
                 id=row[0],
                 name=row[1],
                 description=row[2],
-                task_type=TaskType(row[3]),
+                task_type=_TASK_TYPE[row[3]],
                 command=row[4],
-                arguments=json.loads(row[5] if row[5] else '[]'),
+                arguments=_json_loads(row[5]) if row[5] else [],
                 working_dir=row[6],
-                trigger_type=TriggerType(row[7]),
-                trigger_data=json.loads(row[8] if row[8] else '{}'),
-                status=TaskStatus(row[9]),
+                trigger_type=_TRIGGER_TYPE[row[7]],
+                trigger_data=_json_loads(row[8]) if row[8] else {},
+                status=_TASK_STATUS[row[9]],
                 created_at=row[10],
                 scheduled_for=row[11],
                 executed_at=row[12] if row[12] else "",
                 result_code=row[13] if row[13] else 0,
-                output=row[14] if row[14] else "",
+                output=salida,
                 enabled=bool(row[15]),
                 notify_on_completion=bool(row[16]),
                 max_retries=row[17] if row[17] else 3,
-                retry_count=row[18] if row[18] else 0
+                retry_count=row[18] if row[18] else 0,
+                use_shell=bool(row[20]) if len(row) > 20 else False
             )
             
         except Exception as e:
@@ -342,47 +801,287 @@ class TaskScheduler:
             return None
     
     def _log_execution(self, task_id: int, execution_time: str,
-                      duration: float, result_code: int, output: str):
-        """Registrar ejecución en base de datos"""
+                      duration: float, result_code: int, output: str,
+                      output_z: Optional[bytes] = None):
+        """Encolar el registro de ejecución para el hilo escritor
+
+        La tarea que termina no espera al INSERT ni a su fsync: el hilo
+        escritor agrupa lo encolado y lo confirma en lote. El timestamp
+        numérico acompaña al ISO para que la limpieza compare enteros.
+        """
+        self._log_queue.put(
+            (task_id, execution_time, duration, result_code, output,
+             output_z, int(time.time()))
+        )
+
+    def _log_writer_loop(self):
+        """Drenar la cola de logs en lotes con un executemany por tanda
+
+        Un commit amortizado entre todos los registros pendientes en vez
+        de uno por ejecución. Un None en la cola actúa de centinela de
+        parada y fuerza el vaciado final.
+        """
+        while True:
+            registro = self._log_queue.get()
+            parar = registro is None
+            lote = [] if parar else [registro]
+            try:
+                while True:
+                    registro = self._log_queue.get_nowait()
+                    if registro is None:
+                        parar = True
+                    else:
+                        lote.append(registro)
+            except queue.Empty:
+                pass
+
+            if lote:
+                try:
+                    with self._db_write_lock:
+                        self._db_writer.executemany('''
+                            INSERT INTO execution_logs
+                            (task_id, execution_time, duration_seconds, result_code, output, output_z, execution_ts)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', lote)
+                except Exception as e:
+                    self.logger.error(f"Error registrando ejecuciones: {e}")
+
+            for _ in range(len(lote) + (1 if parar else 0)):
+                self._log_queue.task_done()
+            if parar:
+                return
+
+    def flush_execution_logs(self):
+        """Esperar a que el hilo escritor vacíe la cola de logs"""
+        if self._log_writer_thread.is_alive():
+            self._log_queue.join()
+    
+    def list_tasks(self, filter_status: str = None):
+        """Listar tareas programadas
+
+        El cursor se consume por lotes con fetchmany (memoria acotada
+        aunque haya decenas de miles de tareas) y cada lote sale con un
+        único write en vez de un print —un syscall— por fila.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO execution_logs 
-                (task_id, execution_time, duration_seconds, result_code, output)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (task_id, execution_time, duration, result_code, output))
-            
-            conn.commit()
-            conn.close()
-            
+            query = "SELECT id, name, task_type, trigger_type, status, scheduled_for FROM tasks"
+            params = []
+
+            if filter_status:
+                query += " WHERE status = ?"
+                params.append(filter_status)
+
+            query += " ORDER BY scheduled_for"
+
+            salida = sys.stdout
+            alguna = False
+            with self._checkout_reader() as conn:
+                cursor = conn.execute(query, params)
+                cursor.arraysize = 1000
+                while True:
+                    filas = cursor.fetchmany()
+                    if not filas:
+                        break
+                    if not alguna:
+                        alguna = True
+                        salida.write("\n📋 Tareas Programadas\n")
+                        salida.write("=" * 80 + "\n")
+                        salida.write(
+                            f"{'ID':<5} {'Nombre':<20} {'Tipo':<12} "
+                            f"{'Trigger':<12} {'Estado':<12} {'Programada':<20}\n"
+                        )
+                        salida.write("-" * 80 + "\n")
+                    salida.write("\n".join(
+                        f"{fila[0]:<5} {fila[1][:18]:<20} {fila[2][:10]:<12} "
+                        f"{fila[3][:10]:<12} {fila[4][:10]:<12} "
+                        f"{(fila[5][:19] if fila[5] else 'Inmediato'):<20}"
+                        for fila in filas
+                    ) + "\n")
+
+            if not alguna:
+                print("No hay tareas programadas.")
+                return
+
+            salida.write("\n")
+
         except Exception as e:
-            self.logger.error(f"Error registrando ejecución: {e}")
+            self.logger.error(f"Error listando tareas: {e}")
     
+    # Filas borradas por transacción durante la limpieza: acota el
+    # crecimiento del WAL y deja ventanas entre lotes para los demás
+    # escritores (logs de ejecución, estados de tareas)
+    _CLEANUP_LOTE = 5000
+
+    def _delete_en_lotes(self, sql: str, cutoff: Any) -> int:
+        """Ejecutar un DELETE acotado por LIMIT hasta agotar las filas
+
+        Cada lote es su propia transacción (el escritor va en
+        autocommit) y suelta el lock entre lotes, así una historia
+        grande no bloquea al resto de escritores durante todo el barrido.
+        """
+        total = 0
+        while True:
+            with self._db_write_lock:
+                cursor = self._db_writer.execute(
+                    sql, (cutoff, self._CLEANUP_LOTE)
+                )
+            total += cursor.rowcount
+            if cursor.rowcount < self._CLEANUP_LOTE:
+                return total
+
+    def cleanup_old_tasks(self):
+        """Limpiar tareas antiguas completadas"""
+        try:
+            days = self.config["scheduler"]["cleanup_completed_days"]
+            cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
+
+            # Eliminar logs antiguos: corte numérico (entero de 8 bytes
+            # contra idx_logs_ts) en vez de comparar cadenas ISO por fila.
+            # El DELETE repetido por lote reutiliza el plan preparado del
+            # cache de sentencias de la conexión persistente: se parsea
+            # una vez por proceso, no una vez por lote
+            cutoff_ts = int(time.time()) - days * 86400
+            logs_borrados = self._delete_en_lotes('''
+                DELETE FROM execution_logs WHERE rowid IN (
+                    SELECT rowid FROM execution_logs
+                    WHERE execution_ts < ? LIMIT ?
+                )
+            ''', cutoff_ts)
+
+            # Eliminar tareas completadas antiguas
+            deleted = self._delete_en_lotes('''
+                DELETE FROM tasks WHERE rowid IN (
+                    SELECT rowid FROM tasks
+                    WHERE status IN ('completed', 'failed', 'cancelled')
+                    AND executed_at < ? LIMIT ?
+                )
+            ''', cutoff_date)
+
+            if deleted > 0 or logs_borrados > 0:
+                self.logger.info(
+                    f"Limpiadas {deleted} tareas antiguas "
+                    f"y {logs_borrados} registros de ejecución"
+                )
+
+        except Exception:
+            self.logger.error("Error limpiando tareas antiguas", exc_info=True)
+
+
+class TaskScheduler(TaskDB):
+    """Programador de tareas completo sobre la capa TaskDB"""
+
+    def __init__(self, config_file: str = None):
+        """Inicializar programador de tareas"""
+        super().__init__(config_file)
+
+        # Listas de seguridad precompiladas: un frozenset para el comando
+        # base y una alternación regex para la lista de bloqueo, en vez
+        # de releer la config y recorrerla en cada verificación
+        self._compile_security()
+
+        # Scheduler propio basado en montículo: inserción O(log N),
+        # consulta del próximo disparo O(1) y cero CPU entre disparos.
+        # El hilo duerme en un selector multiplexando la self-pipe
+        # (nuevos trabajos, parada) y el descriptor de inotify, con
+        # timeout hasta el próximo vencimiento: ningún despertar con el
+        # sistema en reposo
+        self._heap: list = []
+        self._heap_lock = threading.Lock()
+        self._heap_seq = itertools.count()  # desempate estable del heap
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        self.running = False
+        self.scheduler_thread = None
+
+        # Pool de ejecución: las tareas corren fuera del hilo del
+        # scheduler, que así nunca queda bloqueado tras un subprocess
+        # largo. Como pasan casi todo el tiempo en subprocess.run (que
+        # suelta el GIL), hilos bastan; el semáforo acota la concurrencia
+        # real aunque lleguen envíos de varios orígenes (schedule,
+        # inotify, CLI)
+        max_tareas = self.config["scheduler"]["max_concurrent_tasks"]
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_tareas, thread_name_prefix="task"
+        )
+        self._task_slots = threading.BoundedSemaphore(max_tareas)
+        
+        # Pool perezoso de workers Python persistentes para SCRIPT:
+        # se arrancan como mucho dos y se reutilizan entre ejecuciones
+        self._py_workers: queue.Queue = queue.Queue()
+        self._py_pool_size = 2
+        self._py_spawned = 0
+        self._py_lock = threading.Lock()
+
+        # Agrupación de notificaciones: las que coinciden en una ventana
+        # de 200 ms salen en un único kdialog
+        self._notif_lock = threading.Lock()
+        self._notif_pending: List[tuple] = []
+        self._notif_timer = None
+
+        # Cache de hashes para detección de cambios (fallback de sondeo)
+        self.file_hashes = {}
+
+        # IDs ya armados en este proceso: la recarga al arrancar los
+        # salta para no duplicar disparos de tareas que el llamante ya
+        # programó con schedule_task
+        self._armed_ids: set = set()
+
+        # Vigilancia de archivos por inotify: un único descriptor que el
+        # propio selector del scheduler vigila, en vez de recalcular
+        # hashes en cada tick o dedicar un hilo aparte. Se crea perezosa-
+        # mente al armar el primer trigger de archivo: las invocaciones
+        # de un solo uso (run N desde cron) no pagan el fd ni el syscall
+        self._inotify = None
+        self._watch_tasks: Dict[int, Task] = {}  # wd → tarea
+
+    def _compile_security(self):
+        """Precompilar las listas de seguridad de la configuración
+
+        La lista de bloqueo se compila en una única alternación regex
+        (escapada): toda la cadena del comando se escanea en una pasada
+        a nivel C en vez de un `in` de Python por patrón. La lista de
+        permitidos pasa a frozenset para pertenencia O(1).
+        """
+        security = self.config["security"]
+        self._allowed_set = frozenset(security["allowed_commands"])
+        blocked = security["blocked_commands"]
+        if blocked:
+            self._blocked_re = re.compile(
+                "|".join(re.escape(p) for p in blocked)
+            )
+        else:
+            self._blocked_re = None
+
     def _check_command_security(self, command: str) -> bool:
         """Verificar seguridad del comando"""
-        # Comandos permitidos
-        allowed = self.config["security"]["allowed_commands"]
-        blocked = self.config["security"]["blocked_commands"]
-        
-        # Verificar comandos bloqueados
-        for blocked_cmd in blocked:
-            if blocked_cmd in command:
-                self.logger.warning(f"Comando bloqueado detectado: {blocked_cmd}")
+        # Verificar comandos bloqueados (una pasada sobre el comando)
+        if self._blocked_re is not None:
+            hit = self._blocked_re.search(command)
+            if hit:
+                self.logger.warning(f"Comando bloqueado detectado: {hit.group()}")
                 return False
-        
+
         # Verificar si el comando está en la lista de permitidos
         # (solo para comandos simples)
-        cmd_base = command.split()[0] if ' ' in command else command
-        if allowed and cmd_base not in allowed:
+        cmd_base = command.partition(' ')[0]
+        if self._allowed_set and cmd_base not in self._allowed_set:
             self.logger.warning(f"Comando no permitido: {cmd_base}")
             return False
-        
+
         return True
     
     def _execute_task(self, task: Task) -> bool:
-        """Ejecutar una tarea"""
+        """Ejecutar una tarea respetando el límite de concurrencia
+
+        El semáforo (y no el GIL) es quien impone max_concurrent_tasks:
+        da igual desde dónde llegue la ejecución (schedule, inotify o la
+        CLI), nunca corren más tareas a la vez que las configuradas.
+        """
+        with self._task_slots:
+            return self._run_task(task)
+
+    def _run_task(self, task: Task) -> bool:
+        """Ejecutar una tarea (cuerpo sin control de concurrencia)"""
         if not task.enabled:
             self.logger.info(f"Tarea deshabilitada: {task.name}")
             return False
@@ -392,14 +1091,15 @@ class TaskScheduler:
             self.logger.error(f"Tarea bloqueada por seguridad: {task.name}")
             task.status = TaskStatus.FAILED
             task.output = "Comando bloqueado por seguridad"
-            self._save_task_to_db(task)
+            self._update_status(task)
             return False
         
         self.logger.info(f"Ejecutando tarea: {task.name}")
         
         # Actualizar estado
         task.status = TaskStatus.RUNNING
-        self._save_task_to_db(task)
+        task._output_z = None  # descartar la salida de la ejecución previa
+        self._update_status(task)
         
         start_time = time.time()
         success = False
@@ -407,79 +1107,27 @@ class TaskScheduler:
         try:
             # Preparar entorno de trabajo
             working_dir = task.working_dir or str(self.home)
-            
-            # Preparar comando completo
-            if task.arguments:
-                full_cmd = [task.command] + task.arguments
-            else:
-                full_cmd = task.command
-            
-            # Ejecutar según tipo de tarea
-            if task.task_type == TaskType.COMMAND:
-                if isinstance(full_cmd, str):
-                    # Comando como string
-                    result = subprocess.run(
-                        full_cmd,
-                        shell=True,
-                        cwd=working_dir,
-                        capture_output=True,
-                        text=True,
-                        timeout=300  # 5 minutos timeout
-                    )
-                else:
-                    # Comando como lista
-                    result = subprocess.run(
-                        full_cmd,
-                        cwd=working_dir,
-                        capture_output=True,
-                        text=True,
-                        timeout=300
-                    )
-                
-                task.result_code = result.returncode
-                task.output = result.stdout + result.stderr
-                success = result.returncode == 0
-                
-            elif task.task_type == TaskType.SCRIPT:
-                # Ejecutar script
-                script_path = task.command
-                if not os.path.isabs(script_path):
-                    script_path = os.path.join(working_dir, script_path)
-                
-                result = subprocess.run(
-                    [sys.executable, script_path] + task.arguments,
-                    cwd=working_dir,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
+
+            # Despachar al runner ligado en schedule_task (evaluación
+            # parcial: la rama por tipo se resolvió al programar); si la
+            # tarea llegó por otra vía (--run, carga desde DB), se
+            # resuelve aquí una vez
+            runner = task._run
+            if runner is None:
+                runner = self._RUNNERS[task.task_type]
+                task._run = runner
+            success = runner(self, task, working_dir)
+
+            # Salidas grandes: persistir comprimidas y dejar en memoria
+            # (y en la columna output) solo el prefijo para mostrar
+            salida_completa = task.output
+            if len(salida_completa) > _SALIDA_COMPRIMIR:
+                task._output_z = _comprimir_salida(salida_completa)
+                task.output = (
+                    salida_completa[:_SALIDA_COMPRIMIR]
+                    + "\n[Salida recortada; la completa está comprimida en la DB]"
                 )
-                
-                task.result_code = result.returncode
-                task.output = result.stdout + result.stderr
-                success = result.returncode == 0
-                
-            elif task.task_type == TaskType.NOTIFICATION:
-                # Enviar notificación
-                if task.command == "kdialog":
-                    subprocess.run(["kdialog", "--title", task.name] + task.arguments)
-                elif task.command == "notify-send":
-                    subprocess.run(["notify-send", task.name] + task.arguments)
-                
-                task.result_code = 0
-                task.output = "Notificación enviada"
-                success = True
-                
-            elif task.task_type == TaskType.REMINDER:
-                # Recordatorio simple
-                message = task.command
-                if task.arguments:
-                    message += " " + " ".join(task.arguments)
-                
-                self._send_notification("Recordatorio", message)
-                task.result_code = 0
-                task.output = "Recordatorio mostrado"
-                success = True
-            
+
             # Calcular duración
             duration = time.time() - start_time
             
@@ -491,16 +1139,18 @@ class TaskScheduler:
                 task.status = TaskStatus.FAILED
                 self.logger.error(f"Tarea fallida: {task.name} ({duration:.2f}s)")
             
-            task.executed_at = datetime.now().isoformat()
-            self._save_task_to_db(task)
+            task.executed_at = _fast_iso()
+            self._update_status(task)
             
-            # Registrar ejecución
+            # Registrar ejecución (el texto en claro va limitado; la
+            # salida completa viaja comprimida)
             self._log_execution(
                 task.id,
                 task.executed_at,
                 duration,
                 task.result_code,
-                task.output[:1000]  # Limitar tamaño
+                task.output[:1000],
+                task._output_z
             )
             
             # Enviar notificación si está habilitado
@@ -521,8 +1171,8 @@ class TaskScheduler:
             self.logger.error(f"Tarea timeout: {task.name}")
             task.status = TaskStatus.FAILED
             task.output = "Timeout (5 minutos)"
-            task.executed_at = datetime.now().isoformat()
-            self._save_task_to_db(task)
+            task.executed_at = _fast_iso()
+            self._update_status(task)
             
             self._send_notification(
                 "⏰ Tarea Timeout",
@@ -534,40 +1184,277 @@ class TaskScheduler:
             self.logger.error(f"Error ejecutando tarea {task.name}: {e}")
             task.status = TaskStatus.FAILED
             task.output = str(e)
-            task.executed_at = datetime.now().isoformat()
-            self._save_task_to_db(task)
+            task.executed_at = _fast_iso()
+            self._update_status(task)
             return False
     
+    def _run_command(self, task: Task, working_dir: str) -> bool:
+        """Ejecutar una tarea COMMAND
+
+        Sin sh intermedio salvo petición expresa: la mitad de fork/exec
+        por comando y sin re-parseo del shell.
+        """
+        if task.use_shell:
+            full_cmd = task.command
+            if task.arguments:
+                full_cmd += " " + " ".join(task.arguments)
+            task.result_code, task.output = self._run_capped(
+                full_cmd, working_dir, shell=True
+            )
+        else:
+            task.result_code, task.output = self._run_capped(
+                task.argv(), working_dir
+            )
+        return task.result_code == 0
+
+    def _run_script(self, task: Task, working_dir: str) -> bool:
+        """Ejecutar una tarea SCRIPT
+
+        Scripts Python van al worker persistente (sin arranque frío del
+        intérprete); el resto, o si no hay worker disponible, por
+        subprocess como siempre.
+        """
+        script_path = task.command
+        if not os.path.isabs(script_path):
+            script_path = os.path.join(working_dir, script_path)
+
+        rc_out_err = None
+        if script_path.endswith('.py'):
+            rc_out_err = self._run_script_in_worker(
+                script_path, task.arguments, working_dir
+            )
+
+        if rc_out_err is not None:
+            task.result_code = rc_out_err[0]
+            task.output = rc_out_err[1] + rc_out_err[2]
+        else:
+            task.result_code, task.output = self._run_capped(
+                [sys.executable, script_path] + task.arguments,
+                working_dir
+            )
+        return task.result_code == 0
+
+    def _run_notification(self, task: Task, working_dir: str) -> bool:
+        """Ejecutar una tarea NOTIFICATION: lanzar y no esperar
+
+        Sin preexec_fn y con los streams a DEVNULL, subprocess usa
+        posix_spawn (vfork+execve) en vez de fork, y la tarea no se
+        queda bloqueada esperando a una GUI.
+        """
+        if task.command == "kdialog":
+            self._spawn_detached(
+                ["kdialog", "--title", task.name] + task.arguments
+            )
+        elif task.command == "notify-send":
+            self._spawn_detached(
+                ["notify-send", task.name] + task.arguments
+            )
+
+        task.result_code = 0
+        task.output = "Notificación enviada"
+        return True
+
+    def _run_reminder(self, task: Task, working_dir: str) -> bool:
+        """Ejecutar una tarea REMINDER (recordatorio simple)"""
+        message = task.command
+        if task.arguments:
+            message += " " + " ".join(task.arguments)
+
+        self._send_notification("Recordatorio", message)
+        task.result_code = 0
+        task.output = "Recordatorio mostrado"
+        return True
+
+    # Tabla tipo → runner: un acceso de dict al programar en vez de la
+    # cadena de comparaciones de Enum en cada ejecución
+    _RUNNERS = {
+        TaskType.COMMAND: _run_command,
+        TaskType.SCRIPT: _run_script,
+        TaskType.NOTIFICATION: _run_notification,
+        TaskType.REMINDER: _run_reminder,
+    }
+
+    # Captura máxima de salida por tarea: más allá de esto un script en
+    # bucle estaría llenando la memoria del scheduler, no informando
+    _SALIDA_MAX = 1024 * 1024  # 1 MiB
+
+    def _run_capped(self, cmd, cwd: str, timeout: float = 300,
+                    shell: bool = False) -> tuple:
+        """Ejecutar un comando con captura de salida acotada
+
+        capture_output=True acumula la salida completa del hijo en
+        memoria sin límite; aquí stdout+stderr (combinados en una sola
+        tubería) se leen en trozos de 64 KiB hasta _SALIDA_MAX. Si el
+        hijo supera el tope se le mata y la tarea queda fallida con la
+        salida truncada. Devuelve (returncode, salida).
+        """
+        proc = subprocess.Popen(
+            cmd,
+            shell=shell,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        captura = bytearray()
+        excedido = False
+        limite = time.monotonic() + timeout
+        fd = proc.stdout.fileno()
+        try:
+            while True:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    proc.kill()
+                    proc.wait()
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+                if not select.select([fd], [], [], restante)[0]:
+                    continue
+                trozo = os.read(fd, 65536)
+                if not trozo:
+                    break
+                captura += trozo
+                if len(captura) > self._SALIDA_MAX:
+                    excedido = True
+                    proc.kill()
+                    break
+            rc = proc.wait(timeout=max(limite - time.monotonic(), 1))
+        finally:
+            proc.stdout.close()
+
+        salida = captura[:self._SALIDA_MAX].decode('utf-8', errors='replace')
+        if excedido:
+            salida += "\n[Salida truncada: superó el límite de captura]"
+            self.logger.error("Proceso matado por exceso de salida")
+            if rc == 0:
+                rc = 1
+        return rc, salida
+
+    def _run_script_in_worker(self, ruta: str, args: List[str],
+                              cwd: str) -> Optional[tuple]:
+        """Ejecutar un script Python en un worker persistente del pool
+
+        Devuelve (rc, stdout, stderr), o None solo si el script aún no
+        se despachó (sin worker libre ni plaza para otro): únicamente en
+        ese caso el llamante puede caer a subprocess sin riesgo. Si el
+        worker muere con el script ya en marcha la tarea falla aquí
+        mismo — reejecutarla duplicaría sus efectos. El timeout se
+        propaga como TimeoutExpired igual que con subprocess.
+        """
+        worker = None
+        try:
+            worker = self._py_workers.get_nowait()
+        except queue.Empty:
+            with self._py_lock:
+                if self._py_spawned < self._py_pool_size:
+                    self._py_spawned += 1
+                    try:
+                        worker = _PyWorker()
+                    except Exception as e:
+                        self._py_spawned -= 1
+                        self.logger.warning(f"No se pudo arrancar worker Python: {e}")
+
+        if worker is None:
+            return None
+
+        try:
+            resultado = worker.run(ruta, args, cwd, timeout=300)
+            self._py_workers.put(worker)
+            return resultado
+        except subprocess.TimeoutExpired:
+            worker.close()
+            with self._py_lock:
+                self._py_spawned -= 1
+            raise
+        except Exception as e:
+            # El script ya estaba despachado: no hay fallback posible
+            # sin arriesgarse a ejecutar sus efectos dos veces
+            self.logger.error(f"Worker Python caído en plena ejecución: {e}")
+            worker.close()
+            with self._py_lock:
+                self._py_spawned -= 1
+            return (1, '', f"Worker Python caído durante la ejecución: {e}")
+
+    def _spawn_detached(self, cmd: List[str]):
+        """Lanzar un proceso sin esperarlo ni heredar los streams"""
+        try:
+            subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+        except Exception:
+            pass  # Silenciar error si el binario no está disponible
+
     def _send_notification(self, title: str, message: str):
-        """Enviar notificación KDE"""
-        if self.config["notifications"]["notify_kde"]:
-            try:
-                subprocess.run([
-                    "kdialog", "--title", title,
-                    "--passivepopup", message, "10"
-                ])
-            except Exception:
-                pass  # Silenciar error si kdialog no está disponible
+        """Enviar notificación KDE (agrupada en ventanas de 200 ms)
+
+        Las notificaciones consecutivas (varias tareas terminando a la
+        vez) se acumulan y salen en un único kdialog en vez de un
+        fork+exec por aviso.
+        """
+        if not self.config["notifications"]["notify_kde"]:
+            return
+        with self._notif_lock:
+            self._notif_pending.append((title, message))
+            if self._notif_timer is None:
+                self._notif_timer = threading.Timer(0.2, self._flush_notifications)
+                self._notif_timer.daemon = True
+                self._notif_timer.start()
+
+    def _flush_notifications(self):
+        """Emitir las notificaciones acumuladas en un solo kdialog"""
+        with self._notif_lock:
+            pendientes = self._notif_pending
+            self._notif_pending = []
+            self._notif_timer = None
+        if not pendientes:
+            return
+        if len(pendientes) == 1:
+            titulo, mensaje = pendientes[0]
+        else:
+            titulo = "Programador de Tareas"
+            mensaje = "\n".join(f"{t}: {m}" for t, m in pendientes)
+        self._spawn_detached(
+            ["kdialog", "--title", titulo, "--passivepopup", mensaje, "10"]
+        )
     
+    def _push_job(self, cuando: float, fn, repetir: Optional[float] = None):
+        """Encolar un trabajo en el montículo y despertar al scheduler
+
+        cuando es epoch absoluto; repetir (segundos) re-encola el trabajo
+        tras cada disparo.
+        """
+        with self._heap_lock:
+            heapq.heappush(self._heap, (cuando, next(self._heap_seq), fn, repetir))
+        self._wake_scheduler()
+
+    def _wake_scheduler(self):
+        """Despertar al selector del scheduler por la self-pipe"""
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass  # tubería llena: el despertar ya está garantizado
+
     def _schedule_time_trigger(self, task: Task):
-        """Programar tarea con trigger de tiempo"""
+        """Programar tarea con trigger de tiempo
+
+        El montículo trabaja con epoch absoluto, así que las fechas
+        lejanas no derivan: el disparo es exacto aunque falten días.
+        """
         try:
             trigger_data = task.trigger_data
             
             if "datetime" in trigger_data:
                 # Fecha/hora específica
                 scheduled_time = datetime.fromisoformat(trigger_data["datetime"])
-                now = datetime.now()
                 
-                if scheduled_time > now:
-                    # Calcular delay en segundos
-                    delay = (scheduled_time - now).total_seconds()
-                    
-                    # Programar con schedule
-                    def job():
-                        self._execute_task(task)
-                    
-                    schedule.every(delay).seconds.do(job).tag(f"task_{task.id}")
+                if scheduled_time > datetime.now():
+                    self._push_job(
+                        scheduled_time.timestamp(),
+                        lambda: self._execute_task(task)
+                    )
                     
             elif "cron" in trigger_data:
                 # Expresión cron
@@ -583,58 +1470,168 @@ class TaskScheduler:
         """Programar tarea con trigger de intervalo"""
         try:
             trigger_data = task.trigger_data
-            
+
+            segundos = None
             if "seconds" in trigger_data:
-                seconds = trigger_data["seconds"]
-                schedule.every(seconds).seconds.do(
-                    lambda: self._execute_task(task)
-                ).tag(f"task_{task.id}")
-                
+                segundos = trigger_data["seconds"]
             elif "minutes" in trigger_data:
-                minutes = trigger_data["minutes"]
-                schedule.every(minutes).minutes.do(
-                    lambda: self._execute_task(task)
-                ).tag(f"task_{task.id}")
-                
+                segundos = trigger_data["minutes"] * 60
             elif "hours" in trigger_data:
-                hours = trigger_data["hours"]
-                schedule.every(hours).hours.do(
-                    lambda: self._execute_task(task)
-                ).tag(f"task_{task.id}")
-                
+                segundos = trigger_data["hours"] * 3600
             elif "days" in trigger_data:
-                days = trigger_data["days"]
-                schedule.every(days).days.do(
-                    lambda: self._execute_task(task)
-                ).tag(f"task_{task.id}")
-                
+                segundos = trigger_data["days"] * 86400
+
+            if segundos:
+                self._push_job(
+                    time.time() + segundos,
+                    lambda: self._execute_task(task),
+                    repetir=segundos
+                )
+
         except Exception as e:
             self.logger.error(f"Error programando trigger de intervalo: {e}")
     
-    def schedule_task(self, task: Task) -> bool:
-        """Programar una tarea"""
-        # Guardar tarea en base de datos
-        task_id = self._save_task_to_db(task)
-        if task_id == -1:
-            return False
-        
-        task.id = task_id
-        
-        # Programar según tipo de trigger
+    def _hash_file(self, path: str) -> str:
+        """Hash md5 de un archivo para el fallback de sondeo"""
+        try:
+            hasher = hashlib.md5()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(block)
+            return hasher.hexdigest()
+        except OSError:
+            return ""
+
+    def _schedule_filechange_trigger(self, task: Task):
+        """Programar tarea que reacciona a cambios en un archivo
+
+        Con inotify el hilo vigilante duerme en el kernel y solo
+        despierta con eventos reales (MODIFY/CLOSE_WRITE/MOVED_TO): cero
+        CPU en reposo. Si inotify_simple no está disponible (o el
+        archivo está en un FS sin soporte, p. ej. NFS), se cae al sondeo
+        por hash con el intervalo del scheduler.
+        """
+        try:
+            path = task.trigger_data.get("path")
+            if not path:
+                self.logger.error(f"Trigger de archivo sin 'path': {task.name}")
+                return
+
+            if INotify is not None:
+                try:
+                    if self._inotify is None:
+                        self._inotify = INotify()
+                        # que el selector registre el fd nuevo
+                        self._wake_scheduler()
+                    wd = self._inotify.add_watch(
+                        path,
+                        inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE |
+                        inotify_flags.MOVED_TO
+                    )
+                    self._watch_tasks[wd] = task
+                    return
+                except OSError as e:
+                    # FS sin inotify (NFS, FUSE...): seguir con sondeo
+                    self.logger.warning(f"inotify no disponible para {path}: {e}")
+
+            # Fallback: sondeo por hash en cada tick del scheduler
+            self.file_hashes[path] = self._hash_file(path)
+
+            def check_file(task=task, path=path):
+                actual = self._hash_file(path)
+                if actual and actual != self.file_hashes.get(path):
+                    self.file_hashes[path] = actual
+                    self._execute_task(task)
+
+            interval = self.config["scheduler"]["check_interval_seconds"]
+            self._push_job(time.time() + interval, check_file, repetir=interval)
+
+        except Exception as e:
+            self.logger.error(f"Error programando trigger de archivo: {e}")
+
+    def _drain_inotify(self):
+        """Despachar al pool los eventos inotify pendientes"""
+        try:
+            for evento in self._inotify.read(timeout=0):
+                task = self._watch_tasks.get(evento.wd)
+                if task is not None and task.enabled:
+                    self._executor.submit(self._execute_task, task)
+        except Exception as e:
+            self.logger.error(f"Error leyendo eventos inotify: {e}")
+
+    def _arm_trigger(self, task: Task):
+        """Armar el trigger de una tarea sobre el scheduler en memoria
+
+        Compartido entre schedule_task y la recarga al arrancar: liga el
+        runner especializado (la rama por tipo de tarea se paga una vez
+        aquí, no en cada ejecución) y encola el disparo que toque.
+        """
+        task._run = self._RUNNERS[task.task_type]
+        if task.id is not None:
+            self._armed_ids.add(task.id)
+
         if task.trigger_type == TriggerType.TIME:
             self._schedule_time_trigger(task)
-            
+
         elif task.trigger_type == TriggerType.INTERVAL:
             self._schedule_interval_trigger(task)
-            
+
         elif task.trigger_type == TriggerType.FILE_CHANGE:
-            # Implementar detección de cambios de archivo
-            pass
-            
+            self._schedule_filechange_trigger(task)
+
         elif task.trigger_type == TriggerType.SYSTEM_EVENT:
             # Implementar triggers de eventos del sistema
             pass
-        
+
+    def _reload_pending_tasks(self):
+        """Reconstruir el montículo con las tareas programadas de la DB
+
+        Un reinicio del daemon perdía todos los disparos programados: el
+        montículo solo se alimentaba de las schedule_task del propio
+        proceso. Se rearman las pendientes y también las recurrentes
+        (intervalo, cambio de archivo) habilitadas aunque su última
+        ejecución las dejara en estado terminal: _run_task las marca
+        completed/failed al terminar y de otro modo un reinicio las
+        descartaría para siempre. Las ya armadas en este proceso se
+        saltan para no duplicar sus disparos.
+        """
+        try:
+            rearmadas = 0
+            # Iterar el cursor en streaming: no se materializa la lista
+            # de IDs aunque haya miles de tareas pendientes
+            with self._checkout_reader() as conn:
+                for (task_id,) in conn.execute('''
+                    SELECT id FROM tasks
+                    WHERE enabled = 1
+                      AND (status = 'pending'
+                           OR trigger_type IN ('interval', 'file_change'))
+                '''):
+                    if task_id in self._armed_ids:
+                        continue
+                    task = self._load_task_from_db(task_id)
+                    if task is not None:
+                        self._arm_trigger(task)
+                        rearmadas += 1
+
+            if rearmadas:
+                self.logger.info(f"Rearmadas {rearmadas} tareas pendientes")
+
+        except Exception:
+            self.logger.error("Error recargando tareas pendientes",
+                              exc_info=True)
+
+    def schedule_task(self, task: Task) -> bool:
+        """Programar una tarea"""
+        # Guardar tarea en base de datos
+        task_id = self._save_task_to_db(task)
+        if task_id == -1:
+            return False
+
+        task.id = task_id
+
+        # Programar según tipo de trigger
+        self._arm_trigger(task)
+
         self.logger.info(f"Tarea programada: {task.name} (ID: {task.id})")
         return True
     
@@ -665,11 +1662,16 @@ class TaskScheduler:
             task_type = task_types.get(type_choice, TaskType.COMMAND)
             
             # Comando/acción
+            use_shell = False
             if task_type in [TaskType.COMMAND, TaskType.SCRIPT]:
                 command = input("Comando o ruta del script: ").strip()
                 args_input = input("Argumentos (separados por espacio): ").strip()
                 arguments = args_input.split() if args_input else []
                 working_dir = input("Directorio de trabajo (opcional): ").strip()
+                if task_type == TaskType.COMMAND:
+                    use_shell = input(
+                        "¿Ejecutar vía shell (tuberías, globs)? (s/n): "
+                    ).strip().lower() == 's'
             elif task_type == TaskType.NOTIFICATION:
                 command = "kdialog"
                 message = input("Mensaje de notificación: ").strip()
@@ -715,7 +1717,7 @@ class TaskScheduler:
                 
             else:
                 trigger_type = TriggerType.TIME
-                trigger_data["datetime"] = datetime.now().isoformat()
+                trigger_data["datetime"] = _fast_iso()
             
             # Configuración adicional
             notify = input("\n¿Notificar al completar? (s/n): ").strip().lower() == 's'
@@ -732,10 +1734,11 @@ class TaskScheduler:
                 trigger_type=trigger_type,
                 trigger_data=trigger_data,
                 status=TaskStatus.PENDING,
-                created_at=datetime.now().isoformat(),
+                created_at=_fast_iso(),
                 scheduled_for=trigger_data.get("datetime", ""),
                 notify_on_completion=notify,
-                enabled=enabled
+                enabled=enabled,
+                use_shell=use_shell
             )
             
             # Programar tarea
@@ -746,7 +1749,11 @@ class TaskScheduler:
                 if trigger_choice == "3":
                     print("Ejecutando tarea ahora...")
                     self._execute_task(task)
-                    
+                    # Drenar el log de ejecución antes de que el proceso
+                    # interactivo termine y atexit cierre la DB
+                    self.flush_execution_logs()
+
+
                 return True
             else:
                 print("❌ Error programando la tarea")
@@ -759,59 +1766,88 @@ class TaskScheduler:
             print(f"❌ Error: {e}")
             return False
     
-    def list_tasks(self, filter_status: str = None):
-        """Listar tareas programadas"""
+    def _scheduler_loop(self):
+        """Bucle del scheduler: dormir en el selector hasta que algo pase
+
+        Un DefaultSelector multiplexa la self-pipe (nuevos trabajos,
+        parada), el descriptor de inotify si existe y el timeout hasta
+        el próximo vencimiento: con el sistema en reposo el hilo no
+        despierta ni una vez, en vez de un tick por segundo "por si
+        acaso". Los trabajos vencidos se envían al pool y los periódicos
+        se re-encolan sin deriva salvo atraso.
+        """
+        sel = selectors.DefaultSelector()
+        sel.register(self._wake_r, selectors.EVENT_READ, "wake")
+        inotify_registrado = False
+
+        # Ligaduras locales del bucle: LOAD_FAST en vez de
+        # LOAD_ATTR/BINARY_SUBSCR en cada vuelta
+        heap = self._heap
+        heap_lock = self._heap_lock
+        heap_seq = self._heap_seq
+        wake_r = self._wake_r
+        sel_select = sel.select
+        submit = self._executor.submit
+        log_err = self.logger.error
+        reloj = time.time
+        heappush, heappop = heapq.heappush, heapq.heappop
+
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            query = "SELECT id, name, task_type, trigger_type, status, scheduled_for FROM tasks"
-            params = []
-            
-            if filter_status:
-                query += " WHERE status = ?"
-                params.append(filter_status)
-            
-            query += " ORDER BY scheduled_for"
-            
-            cursor.execute(query, params)
-            tasks = cursor.fetchall()
-            conn.close()
-            
-            if not tasks:
-                print("No hay tareas programadas.")
-                return
-            
-            print("\n📋 Tareas Programadas")
-            print("=" * 80)
-            print(f"{'ID':<5} {'Nombre':<20} {'Tipo':<12} {'Trigger':<12} {'Estado':<12} {'Programada':<20}")
-            print("-" * 80)
-            
-            for task in tasks:
-                task_id, name, task_type, trigger_type, status, scheduled = task
-                scheduled_str = scheduled[:19] if scheduled else "Inmediato"
-                print(f"{task_id:<5} {name[:18]:<20} {task_type[:10]:<12} "
-                      f"{trigger_type[:10]:<12} {status[:10]:<12} {scheduled_str:<20}")
-            
-            print()
-            
-        except Exception as e:
-            self.logger.error(f"Error listando tareas: {e}")
-    
+            while self.running:
+                # El descriptor inotify se crea perezosamente al armar el
+                # primer trigger de archivo; registrarlo en cuanto exista
+                if not inotify_registrado and self._inotify is not None:
+                    sel.register(
+                        self._inotify.fileno(), selectors.EVENT_READ, "inotify"
+                    )
+                    inotify_registrado = True
+
+                with heap_lock:
+                    timeout = (max(0.0, heap[0][0] - reloj())
+                               if heap else None)
+                for key, _ in sel_select(timeout=timeout):
+                    if key.data == "wake":
+                        os.read(wake_r, 4096)  # drenar la tubería
+                    else:
+                        self._drain_inotify()
+                if not self.running:
+                    break
+
+                now = reloj()
+                while True:
+                    with heap_lock:
+                        if not heap or heap[0][0] > now:
+                            break
+                        cuando, _, fn, repetir = heappop(heap)
+                        if repetir:
+                            siguiente = cuando + repetir
+                            if siguiente <= now:
+                                # Atraso acumulado: re-basar para no
+                                # disparar en ráfaga
+                                siguiente = now + repetir
+                            heappush(
+                                heap,
+                                (siguiente, next(heap_seq), fn, repetir)
+                            )
+                    try:
+                        submit(fn)
+                    except Exception:
+                        # exc_info difiere el formateo al framework de
+                        # logging y conserva el traceback completo
+                        log_err("Error en scheduler loop", exc_info=True)
+        finally:
+            sel.close()
+
     def run_scheduler(self):
         """Ejecutar el scheduler en segundo plano"""
         self.running = True
-        
-        def scheduler_loop():
-            while self.running:
-                try:
-                    schedule.run_pending()
-                except Exception as e:
-                    self.logger.error(f"Error en scheduler loop: {e}")
-                
-                time.sleep(self.config["scheduler"]["check_interval_seconds"])
-        
-        self.scheduler_thread = threading.Thread(target=scheduler_loop, daemon=True)
+
+        # Reconstruir el estado tras un reinicio del daemon
+        self._reload_pending_tasks()
+
+        self.scheduler_thread = threading.Thread(
+            target=self._scheduler_loop, daemon=True
+        )
         self.scheduler_thread.start()
         
         self.logger.info("Scheduler iniciado")
@@ -819,131 +1855,185 @@ class TaskScheduler:
     def stop_scheduler(self):
         """Detener el scheduler"""
         self.running = False
+        self._wake_scheduler()  # despertar al selector dormido
         if self.scheduler_thread:
-            self.scheduler_thread.join(timeout=5)
-        
+            # El despertar por self-pipe es inmediato: el join no
+            # necesita timeout defensivo, el hilo sale en cuanto drena
+            self.scheduler_thread.join()
+
+        # Esperar a las tareas en vuelo y cerrar el pool
+        self._executor.shutdown(wait=True)
+
+        # Cerrar los workers Python persistentes
+        while True:
+            try:
+                self._py_workers.get_nowait().close()
+            except queue.Empty:
+                break
+
+        # Vaciar y parar el escritor de logs (centinela)
+        if self._log_writer_thread.is_alive():
+            self._log_queue.put(None)
+            self._log_writer_thread.join(timeout=5)
+
         self.logger.info("Scheduler detenido")
+        self._log_listener.stop()  # vaciar el logging pendiente
+
+    def __enter__(self):
+        """Arrancar el scheduler al entrar en el with"""
+        self.run_scheduler()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        """Parar el scheduler al salir del with, con o sin excepción"""
+        self.stop_scheduler()
+        return False
     
-    def cleanup_old_tasks(self):
-        """Limpiar tareas antiguas completadas"""
-        try:
-            days = self.config["scheduler"]["cleanup_completed_days"]
-            cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Eliminar logs antiguos
-            cursor.execute('''
-                DELETE FROM execution_logs 
-                WHERE execution_time < ?
-            ''', (cutoff_date,))
-            
-            # Eliminar tareas completadas antiguas
-            cursor.execute('''
-                DELETE FROM tasks 
-                WHERE status IN ('completed', 'failed', 'cancelled')
-                AND executed_at < ?
-            ''', (cutoff_date,))
-            
-            deleted = cursor.rowcount
-            conn.commit()
-            conn.close()
-            
-            if deleted > 0:
-                self.logger.info(f"Limpiadas {deleted} tareas antiguas")
-                
-        except Exception as e:
-            self.logger.error(f"Error limpiando tareas antiguas: {e}")
+def _cmd_daemon(scheduler: "TaskScheduler", args) -> int:
+    """Ejecutar el scheduler como daemon hasta Ctrl+C"""
+    print("🔄 Iniciando scheduler como daemon...")
+    print("   Presiona Ctrl+C para detener")
+    print()
+
+    # SIGTERM (systemctl stop) comparte la ruta de parada limpia de
+    # Ctrl+C en vez de matar el proceso con trabajos en vuelo
+    def _terminar(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _terminar)
+
+    try:
+        # El context manager garantiza stop_scheduler (vaciar logs,
+        # cerrar pool y workers) salga como salga del bloque
+        with scheduler:
+            # Mantener el programa activo sin despertar cada segundo:
+            # el hilo principal duerme hasta Ctrl+C o SIGTERM
+            threading.Event().wait()
+
+    except KeyboardInterrupt:
+        print("\nScheduler detenido")
+    return 0
+
+
+def _cmd_create(scheduler: "TaskScheduler", args) -> int:
+    """Crear una tarea nueva interactivamente"""
+    return 0 if scheduler.create_task_interactive() else 1
+
+
+def _cmd_list(scheduler: "TaskDB", args) -> int:
+    """Listar tareas programadas
+
+    El filtro llega por --status; solo se pregunta interactivamente si
+    hay un terminal delante, así un cron con stdin cerrado no se queda
+    bloqueado en input().
+    """
+    filter_status = args.status
+    if filter_status is None and sys.stdin.isatty():
+        filter_status = input(
+            "Filtrar por estado (dejar vacío para todos): "
+        ).strip() or None
+    scheduler.list_tasks(filter_status)
+    return 0
+
+
+def _cmd_run(scheduler: "TaskScheduler", args) -> int:
+    """Ejecutar una tarea concreta por ID"""
+    task = scheduler._load_task_from_db(args.task_id)
+    if task:
+        print(f"Ejecutando tarea: {task.name}")
+        scheduler._execute_task(task)
+        # El registro va por el hilo escritor; sin este drenaje el
+        # proceso one-shot puede cerrar la DB antes del INSERT
+        scheduler.flush_execution_logs()
+        return 0
+    print(f"❌ Tarea no encontrada: ID {args.task_id}")
+    return 1
+
+
+def _cmd_cleanup(scheduler: "TaskDB", args) -> int:
+    """Limpiar tareas antiguas completadas"""
+    print("🧹 Limpiando tareas antiguas...")
+    scheduler.cleanup_old_tasks()
+    print("✅ Limpieza completada")
+    return 0
+
+
+def _cmd_menu(scheduler: "TaskScheduler", args) -> int:
+    """Menú interactivo simple (sin subcomando)"""
+    print("\nOpciones:")
+    print("  1. Crear nueva tarea")
+    print("  2. Listar tareas")
+    print("  3. Ejecutar scheduler en background")
+    print("  4. Limpiar tareas antiguas")
+    print("  5. Salir")
+
+    choice = input("\nSelecciona (1-5): ").strip()
+
+    if choice == "1":
+        scheduler.create_task_interactive()
+    elif choice == "2":
+        scheduler.list_tasks()
+    elif choice == "3":
+        # Ejecutar en segundo plano
+        scheduler.run_scheduler()
+        print("✅ Scheduler ejecutándose en background")
+        print("   Para detener: pkill -f programador_tareas.py")
+    elif choice == "4":
+        scheduler.cleanup_old_tasks()
+    else:
+        print("👋 ¡Hasta luego!")
+    return 0
+
+
+# Despacho por subcomando: un acceso de dict en vez de la cadena de
+# comparaciones sobre flags booleanos
+_CMDS = {
+    "daemon": _cmd_daemon,
+    "create": _cmd_create,
+    "list": _cmd_list,
+    "run": _cmd_run,
+    "cleanup": _cmd_cleanup,
+    None: _cmd_menu,
+}
+
+# Flags antiguos aceptados como alias de los subcomandos (setup.sh y
+# las unidades systemd existentes invocan --daemon)
+_LEGACY_FLAGS = {"--daemon", "--create", "--list", "--run", "--cleanup"}
+
 
 def main():
     """Función principal"""
     print("📅 Programador de Tareas - KDE Plasma")
     print("=" * 50)
-    
-    scheduler = TaskScheduler()
-    
-    # Verificar dependencias
-    try:
-        import schedule
-    except ImportError:
-        print("❌ Error: schedule no está instalado")
-        print("   Instala con: pip install schedule")
-        return 1
-    
-    # Opciones de ejecución
-    import argparse
+
+    argv = sys.argv[1:]
+    if argv and argv[0] in _LEGACY_FLAGS:
+        argv[0] = argv[0][2:]
+
     parser = argparse.ArgumentParser(description="Programador de Tareas")
-    parser.add_argument("--daemon", action="store_true", help="Ejecutar como daemon")
-    parser.add_argument("--create", action="store_true", help="Crear nueva tarea")
-    parser.add_argument("--list", action="store_true", help="Listar tareas")
-    parser.add_argument("--run", type=int, help="Ejecutar tarea específica (ID)")
-    parser.add_argument("--cleanup", action="store_true", help="Limpiar tareas antiguas")
-    
-    args = parser.parse_args()
-    
-    if args.daemon:
-        print("🔄 Iniciando scheduler como daemon...")
-        print("   Presiona Ctrl+C para detener")
-        print()
-        
-        try:
-            scheduler.run_scheduler()
-            
-            # Mantener el programa activo
-            while True:
-                time.sleep(1)
-                
-        except KeyboardInterrupt:
-            print("\nDeteniendo scheduler...")
-            scheduler.stop_scheduler()
-            
-    elif args.create:
-        scheduler.create_task_interactive()
-        
-    elif args.list:
-        filter_status = input("Filtrar por estado (dejar vacío para todos): ").strip()
-        scheduler.list_tasks(filter_status if filter_status else None)
-        
-    elif args.run:
-        task = scheduler._load_task_from_db(args.run)
-        if task:
-            print(f"Ejecutando tarea: {task.name}")
-            scheduler._execute_task(task)
-        else:
-            print(f"❌ Tarea no encontrada: ID {args.run}")
-            
-    elif args.cleanup:
-        print("🧹 Limpiando tareas antiguas...")
-        scheduler.cleanup_old_tasks()
-        print("✅ Limpieza completada")
-        
+    sub = parser.add_subparsers(dest="cmd")
+    sub.add_parser("daemon", help="Ejecutar como daemon")
+    sub.add_parser("create", help="Crear nueva tarea")
+    parser_list = sub.add_parser("list", help="Listar tareas")
+    parser_list.add_argument(
+        "--status",
+        choices=["pending", "running", "completed", "failed", "cancelled"],
+        default=None,
+        help="Filtrar por estado (sin flag: todas, o pregunta si hay terminal)"
+    )
+    parser_run = sub.add_parser("run", help="Ejecutar tarea específica")
+    parser_run.add_argument("task_id", type=int, help="ID de la tarea")
+    sub.add_parser("cleanup", help="Limpiar tareas antiguas")
+
+    args = parser.parse_args(argv)
+
+    # Los comandos de un solo uso lanzados desde cron no necesitan el
+    # scheduler completo: la capa TaskDB basta y arranca menos hilos
+    if args.cmd in ("cleanup", "list"):
+        scheduler = TaskDB()
     else:
-        # Modo interactivo simple
-        print("\nOpciones:")
-        print("  1. Crear nueva tarea")
-        print("  2. Listar tareas")
-        print("  3. Ejecutar scheduler en background")
-        print("  4. Limpiar tareas antiguas")
-        print("  5. Salir")
-        
-        choice = input("\nSelecciona (1-5): ").strip()
-        
-        if choice == "1":
-            scheduler.create_task_interactive()
-        elif choice == "2":
-            scheduler.list_tasks()
-        elif choice == "3":
-            # Ejecutar en segundo plano
-            scheduler.run_scheduler()
-            print("✅ Scheduler ejecutándose en background")
-            print("   Para detener: pkill -f programador_tareas.py")
-        elif choice == "4":
-            scheduler.cleanup_old_tasks()
-        else:
-            print("👋 ¡Hasta luego!")
-    
-    return 0
+        scheduler = TaskScheduler()
+    return _CMDS[args.cmd](scheduler, args)
 
 if __name__ == "__main__":
     exit(main())
\ No newline at end of file